@@ -0,0 +1,171 @@
+"""モンテカルロ実行
+シードを変えたヘッドレスのゲームを複数プロセスで並列に実行し，
+難易度の設定(`enemy_num`, `food_num`, `field_size`)ごとの統計を取るスクリプト．
+
+Usage:
+    python batch.py -p parameters.json --games 1000 --workers 8
+"""
+import os
+import json
+import time
+import random
+import logging
+import argparse
+import statistics
+from collections import Counter
+from dataclasses import asdict, replace
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config import common_args, Parameters
+from utils import dump_params, setup_params
+from utils import set_logging
+from game import Game
+
+
+logger = logging.getLogger(__name__)
+
+
+def play(
+        params: Parameters,
+        index: int,
+        seed: int,
+        replay_dir: str | None = None) -> dict:
+    """
+    1ゲームをヘッドレスで実行する関数．ワーカープロセスで呼び出される．
+
+    Args:
+        params (Parameters): configのパラメータのインスタンス
+        index (int): ゲームの番号
+        seed (int): 乱数のシード
+        replay_dir (str | None): リプレイの書き出し先，Noneなら記録しない
+
+    Returns:
+        dict: ゲームの番号，シード，ヘッドレス実行の結果
+
+    Examples:
+        >>> params = Parameters(headless=True, field_size=10, enemy_num=3)
+        >>> a, b = play(params, 0, 1), play(params, 0, 1)
+        >>> a["ticks"] == b["ticks"] and a["cause"] == b["cause"]
+        True
+    """
+    replay_path = None
+    if replay_dir is not None:
+        replay_path = f'{replay_dir}/game_{index:06d}.bin'
+    result = Game(replace(params, seed=seed), replay_path=replay_path).result
+    return {"game": index, "seed": seed, **asdict(result)}
+
+
+def summarize(results: list[dict], elapsed: float, workers: int) -> dict:
+    """
+    ゲームごとの結果を集計する関数
+
+    Args:
+        results (list[dict]): ゲームごとの結果
+        elapsed (float): 全体の実行時間(秒)
+        workers (int): ワーカープロセス数
+
+    Returns:
+        dict: 集計した統計
+
+    Examples:
+        >>> results = [
+        ...     {"stages_cleared": 1, "ticks": 10, "cause": "enemy"},
+        ...     {"stages_cleared": 3, "ticks": 30, "cause": "max_ticks"}]
+        >>> summary = summarize(results, 2.0, 1)
+        >>> summary["stages_cleared"]["mean"], summary["causes"]["enemy"]
+        (2, 1)
+        >>> summary["games_per_sec"]
+        1.0
+    """
+    stages = [r["stages_cleared"] for r in results]
+    ticks = [r["ticks"] for r in results]
+    return {
+        "games": len(results),
+        "workers": workers,
+        "elapsed": elapsed,
+        "games_per_sec": len(results) / elapsed if elapsed > 0 else 0.0,
+        "ticks_per_sec": sum(ticks) / elapsed if elapsed > 0 else 0.0,
+        "stages_cleared": _describe(stages),
+        "ticks": _describe(ticks),
+        "causes": dict(Counter(r["cause"] for r in results)),
+    }
+
+
+def _describe(values: list[int]) -> dict:
+    """平均，標準偏差，最小値，中央値，最大値を返す"""
+    if not values:
+        return {}
+    return {
+        "mean": statistics.mean(values),
+        "stdev": statistics.pstdev(values),
+        "min": min(values),
+        "median": statistics.median(values),
+        "max": max(values),
+    }
+
+
+def main() -> None:
+
+    # コマンドライン引数の設定
+    parser = argparse.ArgumentParser()
+    parser = common_args(parser)  # コマンドライン引数引数を読み込み
+    parser.add_argument(
+        "--games", help="実行するゲームの数", type=int, default=100)
+    parser.add_argument(
+        "--workers",
+        help="ワーカープロセス数．デフォルトはCPUのコア数",
+        type=int,
+        default=os.cpu_count())
+    parser.add_argument(
+        "--seed",
+        help="最初のゲームのシード．i番目のゲームはseed + i．"
+             "指定がなければパラメータのseed(負ならランダム)",
+        type=int,
+        default=None)
+    args = parser.parse_args()
+    params = Parameters(**setup_params(vars(args), args.parameters))
+    params = replace(params, headless=True)  # 並列実行は常にヘッドレス
+    # 最初のゲームのシードを決め，parameters.jsonに実際に使ったシードを残す
+    seed = params.seed if args.seed is None else args.seed
+    if seed < 0:
+        seed = random.SystemRandom().randrange(2 ** 32)
+    params = replace(params, seed=seed)
+
+    # 結果出力用ファイルの作成
+    result_dir = f'result/{params.run_date}'  # 結果出力ディレクトリ
+    os.mkdir(result_dir)  # 実行日時を名前とするディレクトリを作成
+    dump_params(params, f'{result_dir}')  # パラメータを出力
+    replay_dir = f'{result_dir}/replays'  # ゲームごとのリプレイの出力先
+    os.mkdir(replay_dir)
+
+    # ログ設定
+    set_logging(result_dir)  # ログを標準出力とファイルに出力するよう設定
+    logging.getLogger("game").setLevel(logging.WARNING)  # 1ゲームごとのログは出さない
+    logger.info(params)
+
+    # ゲームを並列に実行し，終わったものから順に結果を書き出す
+    results = []
+    begin = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor, \
+            open(f'{result_dir}/games.jsonl', 'w') as f:
+        futures = [
+            executor.submit(play, params, i, seed + i, replay_dir)
+            for i in range(args.games)]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+            logger.debug(result)
+            if len(results) % max(args.games // 10, 1) == 0:
+                logger.info(f'{len(results)}/{args.games} games finished')
+    elapsed = time.perf_counter() - begin
+
+    # 集計した統計を出力
+    summary = summarize(results, elapsed, args.workers)
+    with open(f'{result_dir}/summary.json', 'w') as f:
+        json.dump(summary, f, indent=4)
+    logger.info(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""ベンチマーク
+ゲームの主要な処理の実行時間を，`field_size`と`enemy_num`の組み合わせごとに計測し，
+jsonファイルに書き出すスクリプト．保存したベースラインと比較して遅くなった処理を報告できる．
+
+Usage:
+    python benchmark.py -o baseline.json
+    python benchmark.py --compare baseline.json --threshold 0.2
+"""
+import os
+import sys
+import json
+import time
+import random
+import platform
+import tempfile
+import subprocess
+import argparse
+import statistics
+import contextlib
+from datetime import datetime
+from typing import Callable
+from config import Parameters
+from game import Game, CONTINUE
+from utils import read_git_revision
+from snapshot import save, load
+
+
+FIELD_SIZES = [20, 100, 400]
+ENEMY_NUMS = [10, 100, 1000]
+
+
+def measure(
+        func: Callable[[], object],
+        prepare: Callable[[], object] | None = None,
+        min_time: float = 0.2,
+        max_iterations: int = 10000) -> dict:
+    """
+    関数を繰り返し実行し，1回あたりの実行時間を計測する関数
+    prepareは毎回funcの前に呼び出され，計測には含まれない．
+
+    Args:
+        func (Callable[[], object]): 計測する関数
+        prepare (Callable[[], object] | None): 計測前の準備をする関数
+        min_time (float): 計測を続ける最短の合計時間(秒)
+        max_iterations (int): 最大の繰り返し回数
+
+    Returns:
+        dict: 繰り返し回数と，1回あたりの時間(マイクロ秒)の平均，中央値，最小値
+
+    Examples:
+        >>> r = measure(lambda: None, min_time=0.0, max_iterations=3)
+        >>> r["iterations"]
+        3
+    """
+    samples = []
+    total = 0.0
+    while len(samples) < max_iterations and (
+            total < min_time or len(samples) < 3):
+        if prepare is not None:
+            prepare()
+        begin = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - begin
+        samples.append(elapsed)
+        total += elapsed
+    return {
+        "iterations": len(samples),
+        "mean_us": statistics.mean(samples) * 1e6,
+        "median_us": statistics.median(samples) * 1e6,
+        "min_us": min(samples) * 1e6,
+    }
+
+
+def bench_case(f_size: int, e_num: int, min_time: float) -> list[dict]:
+    """
+    1つのフィールドサイズと敵の数の組み合わせで，各処理を計測する関数
+
+    Args:
+        f_size (int): フィールドサイズ
+        e_num (int): 敵の数
+        min_time (float): 処理ごとに計測を続ける最短の合計時間(秒)
+
+    Returns:
+        list[dict]: 処理ごとの計測結果
+    """
+    params = Parameters(
+        field_size=f_size, enemy_num=e_num, seed=0, headless=True)
+    game = Game(params, autostart=False)
+    field = game.field
+    player = game.players[0]
+    devnull = open(os.devnull, "w")
+
+    def display() -> None:
+        with contextlib.redirect_stdout(devnull):
+            field.display_field()
+
+    def choose_enemy_moves() -> None:
+        for enemy in game.enemies:
+            enemy.get_next_pos(game.rng)
+
+    def reset_if_over() -> None:
+        if state["outcome"] != CONTINUE:
+            game.setup(params)
+            state["outcome"] = CONTINUE
+
+    snapshot_path = os.path.join(tempfile.mkdtemp(), "snapshot.bin")
+
+    def restore() -> None:
+        with load(snapshot_path) as snapshot:
+            Game(params, autostart=False, snapshot=snapshot)
+
+    state = {"outcome": CONTINUE}
+    keys = random.Random(0)
+
+    def tick() -> None:
+        state["outcome"] = game.step([keys.choice("wasd")])
+
+    cases = [
+        ("update_field", field.update_field, None),
+        ("display_field", display, None),
+        ("collision", lambda: field.collision(player, field.enemies), None),
+        ("post_collision_processing",
+         lambda: field.post_collision_processing(field.enemies, 2),
+         choose_enemy_moves),
+        ("setup", lambda: game.setup(params), None),
+        ("snapshot_save", lambda: save(game, snapshot_path), None),
+        ("snapshot_restore", restore, None),
+    ]
+    results = []
+    for name, func, prepare in cases:
+        results.append({
+            "name": name,
+            "field_size": f_size,
+            "enemy_num": e_num,
+            **measure(func, prepare, min_time)})
+    # setupで作り直されたフィールドで1ティック全体を計測する
+    results.append({
+        "name": "headless_tick",
+        "field_size": f_size,
+        "enemy_num": e_num,
+        **measure(tick, reset_if_over, min_time)})
+    devnull.close()
+    os.remove(snapshot_path)
+    return results
+
+
+def bench_startup(min_time: float) -> list[dict]:
+    """
+    起動にかかる時間を計測する関数
+    ヘッドレスのゲームを別々のプロセスで大量に実行する場合は，起動の時間が全体の時間を左右する．
+    結果はフィールドサイズと敵の数を0として記録する．
+
+    Args:
+        min_time (float): 処理ごとに計測を続ける最短の合計時間(秒)
+
+    Returns:
+        list[dict]: 処理ごとの計測結果
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    def command(*args: str) -> Callable[[], object]:
+        return lambda: subprocess.run(
+            [sys.executable, *args], cwd=here, check=True,
+            stdout=subprocess.DEVNULL)
+
+    cases = [
+        # インタプリタ自体の起動時間(比較の基準)
+        ("startup_python", command("-c", "pass")),
+        # 引数の解析までで終わる起動
+        ("startup_main_help", command("main.py", "-h")),
+        # ゲームのモジュールを全て読み込むまで
+        ("startup_import_game", command("-c", "import game")),
+        ("git_revision", lambda: read_git_revision(here)),
+    ]
+    return [
+        {"name": name, "field_size": 0, "enemy_num": 0,
+         **measure(func, min_time=min_time, max_iterations=100)}
+        for name, func in cases]
+
+
+def run(
+        field_sizes: list[int],
+        enemy_nums: list[int],
+        min_time: float) -> dict:
+    """
+    起動時間と，全ての組み合わせでベンチマークを実行する関数
+    敵が壁の内側のマスの半分より多い組み合わせは飛ばす．
+
+    Args:
+        field_sizes (list[int]): フィールドサイズのリスト
+        enemy_nums (list[int]): 敵の数のリスト
+        min_time (float): 処理ごとに計測を続ける最短の合計時間(秒)
+
+    Returns:
+        dict: 実行環境の情報と計測結果
+    """
+    results = bench_startup(min_time)
+    for f_size in field_sizes:
+        for e_num in enemy_nums:
+            if e_num > (f_size - 2) ** 2 // 2:
+                continue
+            results.extend(bench_case(f_size, e_num, min_time))
+            print(f"field_size={f_size} enemy_num={e_num} done",
+                  file=sys.stderr)
+    return {
+        "meta": {
+            "date": datetime.now().strftime('%Y%m%d_%H%M%S'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def compare(
+        current: dict,
+        baseline: dict,
+        threshold: float) -> list[dict]:
+    """
+    ベースラインと比べて中央値が閾値より遅くなった処理を返す関数
+
+    Args:
+        current (dict): 今回の計測結果
+        baseline (dict): ベースラインの計測結果
+        threshold (float): 許容する遅くなった割合(0.2なら20%まで許容)
+
+    Returns:
+        list[dict]: 遅くなった処理と，ベースラインに対する比
+
+    Examples:
+        >>> base = {"results": [
+        ...     {"name": "a", "field_size": 20, "enemy_num": 10,
+        ...      "median_us": 10.0}]}
+        >>> now = {"results": [
+        ...     {"name": "a", "field_size": 20, "enemy_num": 10,
+        ...      "median_us": 15.0}]}
+        >>> compare(now, base, 0.2)[0]["ratio"]
+        1.5
+        >>> compare(now, base, 0.6)
+        []
+    """
+    def key(r: dict) -> tuple:
+        return (r["name"], r["field_size"], r["enemy_num"])
+
+    base = {key(r): r for r in baseline["results"]}
+    regressions = []
+    for r in current["results"]:
+        b = base.get(key(r))
+        if b is None or b["median_us"] <= 0:
+            continue
+        ratio = r["median_us"] / b["median_us"]
+        if ratio > 1 + threshold:
+            regressions.append({
+                "name": r["name"],
+                "field_size": r["field_size"],
+                "enemy_num": r["enemy_num"],
+                "baseline_us": b["median_us"],
+                "current_us": r["median_us"],
+                "ratio": ratio,
+            })
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="結果を書き出すjsonファイルのパス．デフォルトはresult/benchmark_<実行日時>.json",
+        type=str,
+        default=None)
+    parser.add_argument(
+        "--field-sizes", help="計測するフィールドサイズ", type=int, nargs="+",
+        default=FIELD_SIZES)
+    parser.add_argument(
+        "--enemy-nums", help="計測する敵の数", type=int, nargs="+",
+        default=ENEMY_NUMS)
+    parser.add_argument(
+        "--min-time", help="処理ごとに計測を続ける最短の合計時間(秒)",
+        type=float, default=0.2)
+    parser.add_argument(
+        "--compare", help="比較するベースラインのjsonファイルのパス", type=str,
+        default=None)
+    parser.add_argument(
+        "--threshold", help="遅くなったとみなす割合(0.2なら中央値が20%%より遅い場合)",
+        type=float, default=0.2)
+    args = parser.parse_args()
+
+    current = run(args.field_sizes, args.enemy_nums, args.min_time)
+    output = args.output or f"result/benchmark_{current['meta']['date']}.json"
+    with open(output, "w") as f:
+        json.dump(current, f, indent=4)
+    for r in current["results"]:
+        print(f"{r['name']:>26} field_size={r['field_size']:<5} "
+              f"enemy_num={r['enemy_num']:<5} {r['median_us']:>12.1f} us")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['name']} field_size={r['field_size']} "
+                  f"enemy_num={r['enemy_num']}: {r['baseline_us']:.1f} us -> "
+                  f"{r['current_us']:.1f} us (x{r['ratio']:.2f})")
+        if regressions:
+            sys.exit(1)
+        print("no regression")
+
+
+if __name__ == "__main__":
+    main()
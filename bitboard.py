@@ -0,0 +1,249 @@
+"""動かない障害物のビットボード
+壁と障害物はステージの生成後に動かないため，1行をx座標のビットが立ったPythonの整数で持ち，
+ビット演算でまとめて調べる．障害物のある行だけを辞書に持つため，メモリは障害物のある行の数に
+比例し，フィールドの広さによらない．外周の壁はビットを持たず，座標で判定する．
+"""
+from typing import Iterable, Iterator
+from item import Item
+
+
+LAYERS = ("wall", "block")  # ビットボードで持つレイヤ
+
+
+class ObstacleBoard:
+    """動かない障害物のビットボード
+    マス(x, y)はレイヤの辞書の`y`行目の整数の`x`ビット目に入る．障害物のない行は持たない．
+    外周を壁とする場合，外周のマスは"wall"のレイヤで常に障害物ありとなる．
+    フィールドの外のマスは，どのレイヤでも障害物なしとして扱う．
+
+    Attributes:
+        f_size (int): フィールドサイズ
+        boundary (bool): 外周のマスを壁とするかどうか
+        rows (dict[str, dict[int, int]]): レイヤごとの，y座標 -> 行のビット
+
+    Examples:
+        >>> from wall import Wall
+        >>> from block import Block
+        >>> board = ObstacleBoard(10, [Wall(0, 1)], [Block(2, 1), Block(9, 9)])
+        >>> board.test("wall", 0, 1), board.test("block", 0, 1)
+        (True, False)
+        >>> board.test("block", 9, 9), board.test("block", 10, 9)
+        (True, False)
+        >>> board.hits("block", [(2, 1), (3, 1), (9, 9)])
+        [True, False, True]
+        >>> list(board.cells("block"))
+        [(2, 1), (9, 9)]
+        >>> board.rows["block"]  # 障害物のある行だけを持つ
+        {1: 4, 9: 512}
+        >>> board = ObstacleBoard(4, boundary=True)
+        >>> board.background({"wall": "#", "block": "o"}, ".")
+        ['####', '#..#', '#..#', '####']
+        >>> board.rows["wall"], board.test("wall", 3, 2)
+        ({}, True)
+    """
+
+    def __init__(
+            self,
+            f_size: int,
+            walls: Iterable[Item] = (),
+            blocks: Iterable[Item] = (),
+            boundary: bool = False) -> None:
+        """
+        ObstacleBoardクラスの初期化をする関数
+
+        Args:
+            f_size (int): フィールドサイズ
+            walls (Iterable[Item]): 壁
+            blocks (Iterable[Item]): 障害物
+            boundary (bool): Trueなら外周のマスを壁とする
+        """
+        self.f_size = f_size
+        self.boundary = boundary
+        self.rows: dict[str, dict[int, int]] = {layer: {} for layer in LAYERS}
+        self._full = (1 << f_size) - 1  # 1行全てのビット
+        self._edges = 1 | 1 << max(f_size - 1, 0)  # 行の両端のビット
+        for layer, items in (("wall", walls), ("block", blocks)):
+            for item in items:
+                if item.status:
+                    self.add(layer, item.now_x, item.now_y)
+
+    def add(self, layer: str, x: int, y: int) -> None:
+        """
+        マスに障害物を置くメソッド．フィールドの外なら何もしない
+
+        Args:
+            layer (str): レイヤの名前("wall" か "block")
+            x (int): x座標
+            y (int): y座標
+        """
+        if 0 <= x < self.f_size and 0 <= y < self.f_size:
+            rows = self.rows[layer]
+            rows[y] = rows.get(y, 0) | 1 << x
+
+    def test(self, layer: str, x: int, y: int) -> bool:
+        """
+        マスに障害物があるかを返すメソッド
+
+        Args:
+            layer (str): レイヤの名前("wall" か "block")
+            x (int): x座標
+            y (int): y座標
+
+        Returns:
+            bool: 障害物があればTrue
+        """
+        if 0 <= x < self.f_size and 0 <= y < self.f_size:
+            return bool(self.row(layer, y) >> x & 1)
+        return False
+
+    def hits(
+            self,
+            layer: str,
+            cells: Iterable[tuple[int, int]]) -> list[bool]:
+        """
+        複数のマスに障害物があるかをまとめて返すメソッド
+        全ての移動するアイテムの移動先を1回で調べるために使う．
+
+        Args:
+            layer (str): レイヤの名前("wall" か "block")
+            cells (Iterable[tuple[int, int]]): 調べるマスの座標(x, y)
+
+        Returns:
+            list[bool]: マスごとに障害物があればTrue
+        """
+        rows = self.rows[layer]
+        f_size = self.f_size
+        last = f_size - 1
+        edge = self.boundary and layer == "wall"
+        return [
+            0 <= x < f_size and 0 <= y < f_size
+            and (edge and (x in (0, last) or y in (0, last))
+                 or bool(rows.get(y, 0) >> x & 1))
+            for x, y in cells]
+
+    def row(self, layer: str, y: int) -> int:
+        """
+        1行分のビットをPythonの整数として返すメソッド．外周の壁のビットも含む
+
+        Args:
+            layer (str): レイヤの名前("wall" か "block")
+            y (int): y座標
+
+        Returns:
+            int: x座標のビットが立った整数
+
+        Examples:
+            >>> from block import Block
+            >>> board = ObstacleBoard(12, [], [Block(1, 3), Block(9, 3)])
+            >>> bin(board.row("block", 3))
+            '0b1000000010'
+            >>> board = ObstacleBoard(4, boundary=True)
+            >>> bin(board.row("wall", 0)), bin(board.row("wall", 1))
+            ('0b1111', '0b1001')
+        """
+        bits = self.rows[layer].get(y, 0)
+        if self.boundary and layer == "wall" and 0 <= y < self.f_size:
+            bits |= self._full if y in (0, self.f_size - 1) else self._edges
+        return bits
+
+    def cells(self, layer: str) -> Iterator[tuple[int, int]]:
+        """
+        障害物のあるマスを行優先の順に返すメソッド
+        障害物のある行の，立っているビットだけを読む．外周の壁がある場合は全ての行を読む
+
+        Args:
+            layer (str): レイヤの名前("wall" か "block")
+
+        Yields:
+            tuple[int, int]: 障害物のあるマスの座標(x, y)
+        """
+        if self.boundary and layer == "wall":
+            ys = range(self.f_size)
+        else:
+            ys = sorted(self.rows[layer])
+        for y in ys:
+            for x in _set_bits(self.row(layer, y)):
+                yield (x, y)
+
+    def background(
+            self,
+            icons: dict[str, str],
+            blank: str,
+            x0: int = 0,
+            y0: int = 0,
+            width: int | None = None,
+            height: int | None = None) -> list[str]:
+        """
+        壁と障害物だけの背景をビットマスクから描くメソッド
+        後に並んだレイヤのアイコンを優先する．各行のビットを1マス1バイトのフラグに広げ，
+        文字列の置き換えでアイコンにするため，マスを1つずつPythonで調べない．
+
+        Args:
+            icons (dict[str, str]): レイヤごとのアイコン
+            blank (str): 何もないマスのアイコン
+            x0 (int): 範囲の左端のx座標
+            y0 (int): 範囲の上端のy座標
+            width (int | None): 範囲の幅，Noneならフィールドの右端まで
+            height (int | None): 範囲の高さ，Noneならフィールドの下端まで
+
+        Returns:
+            list[str]: 範囲の各行の文字列
+
+        Examples:
+            >>> from wall import Wall
+            >>> from block import Block
+            >>> walls = [Wall(0, 0), Wall(1, 0)]
+            >>> board = ObstacleBoard(3, walls, [Block(1, 1)])
+            >>> board.background({"wall": "#", "block": "o"}, ".")
+            ['##.', '.o.', '...']
+            >>> board.background({"wall": "#", "block": "o"}, ".", 1, 0, 2, 2)
+            ['#.', 'o.']
+        """
+        width = self.f_size - x0 if width is None else width
+        height = self.f_size - y0 if height is None else height
+        window = (1 << width) - 1
+        # マスごとに，障害物のあるレイヤのビットを立てた1バイトのフラグ -> アイコン
+        table = {
+            flags: icons[LAYERS[flags.bit_length() - 1]] if flags else blank
+            for flags in range(1 << len(LAYERS))}
+        empty = blank * width
+        lines = []
+        for y in range(y0, y0 + height):
+            flags = 0
+            if 0 <= y < self.f_size:
+                for k, layer in enumerate(LAYERS):
+                    # 範囲の外のビットを落とし，1マス1バイトに広げてから重ねる
+                    bits = (self.row(layer, y) >> x0 if x0 >= 0
+                            else self.row(layer, y) << -x0) & window
+                    if bits:
+                        digits = format(bits, f"0{width}b")[::-1].encode()
+                        flags |= int.from_bytes(
+                            digits.translate(_SPREAD[k]), "little")
+            lines.append(
+                flags.to_bytes(width, "little").decode("latin-1")
+                .translate(table) if flags else empty)
+        return lines
+
+
+# 2進数の各桁(b"0"かb"1")を，レイヤの番号のビットを立てたバイトに置き換える表
+_SPREAD = [
+    bytes.maketrans(b"01", bytes([0, 1 << k])) for k in range(len(LAYERS))]
+
+
+def _set_bits(bits: int) -> Iterator[int]:
+    """
+    立っているビットの位置を小さい順に返す
+
+    Examples:
+        >>> list(_set_bits(0b101001))
+        [0, 3, 5]
+    """
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -23,6 +23,8 @@ class Block(Item):
         True
     """
 
+    __slots__ = ()
+
     def __init__(self, x, y) -> None:
         super().__init__(x, y)
         self.icon = "🗻"
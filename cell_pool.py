@@ -0,0 +1,194 @@
+"""空きマスの管理
+ステージ生成時にアイテムを重ならないように配置するための空きマスのプール
+"""
+import math
+import random
+from typing import Iterator
+
+
+class FreeCellPool:
+    """空きマスのプール
+    長方形の範囲のマスを，重複なしで取り出せるように管理するクラス．
+    マスを番号で並べた配列に対するFisher-Yatesのシャッフルを，
+    入れ替えたところだけ辞書に記録して行うため，
+    取り出し1回あたりの時間は定数で，メモリは取り出したマスの数に比例する．
+
+    Attributes:
+        x_min (int): 範囲の左端のx座標
+        y_min (int): 範囲の上端のy座標
+        width (int): 範囲の幅
+        height (int): 範囲の高さ
+
+    Examples:
+        >>> pool = FreeCellPool(1, 1, 2, 2, random.Random(0))
+        >>> len(pool)
+        4
+        >>> pool.take(1, 1)
+        True
+        >>> pool.take(1, 1)
+        False
+        >>> sorted(pool.sample() for _ in range(3))
+        [(1, 2), (2, 1), (2, 2)]
+        >>> pool.sample()
+        Traceback (most recent call last):
+        ...
+        ValueError: no free cell left
+    """
+
+    def __init__(
+            self,
+            x_min: int,
+            y_min: int,
+            x_max: int,
+            y_max: int,
+            rng: random.Random | None = None) -> None:
+        """
+        FreeCellPoolクラスの初期化をする関数
+
+        Args:
+            x_min (int): 範囲の左端のx座標
+            y_min (int): 範囲の上端のy座標
+            x_max (int): 範囲の右端のx座標(範囲に含む)
+            y_max (int): 範囲の下端のy座標(範囲に含む)
+            rng (random.Random | None): 乱数生成器，Noneならrandomモジュール
+        """
+        self.x_min = x_min
+        self.y_min = y_min
+        self.width = max(x_max - x_min + 1, 0)
+        self.height = max(y_max - y_min + 1, 0)
+        self.rng = rng or random
+        self._size = self.width * self.height  # 残っている空きマスの数
+        # 配列の位置 -> マス番号 と マス番号 -> 配列の位置(入れ替えたものだけ)
+        self._cell_at: dict[int, int] = {}
+        self._pos_of: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        """残っている空きマスの数"""
+        return self._size
+
+    def __contains__(self, cell: tuple[int, int]) -> bool:
+        """
+        マスが空いているかを返す
+
+        Examples:
+            >>> pool = FreeCellPool(1, 1, 3, 3)
+            >>> (2, 2) in pool, (0, 0) in pool
+            (True, False)
+        """
+        index = self._index(*cell)
+        return index is not None and self._pos(index) < self._size
+
+    def sample(self) -> tuple[int, int]:
+        """
+        空きマスを1つランダムに取り出すメソッド
+
+        Returns:
+            tuple[int, int]: 取り出したマスの座標(x, y)
+
+        Raises:
+            ValueError: 空きマスが残っていない場合
+        """
+        if self._size == 0:
+            raise ValueError("no free cell left")
+        index = self._remove_at(self.rng.randrange(self._size))
+        return (self.x_min + index % self.width,
+                self.y_min + index // self.width)
+
+    def take(self, x: int, y: int) -> bool:
+        """
+        指定したマスが空いていれば取り出すメソッド
+
+        Args:
+            x (int): x座標
+            y (int): y座標
+
+        Returns:
+            bool: 取り出せればTrue，範囲外か既に取り出されていればFalse
+        """
+        index = self._index(x, y)
+        if index is None:
+            return False
+        pos = self._pos(index)
+        if pos >= self._size:
+            return False
+        self._remove_at(pos)
+        return True
+
+    def _index(self, x: int, y: int) -> int | None:
+        """座標をマス番号に変換する．範囲外ならNone"""
+        dx = x - self.x_min
+        dy = y - self.y_min
+        if 0 <= dx < self.width and 0 <= dy < self.height:
+            return dy * self.width + dx
+        return None
+
+    def _cell(self, pos: int) -> int:
+        """配列の位置にあるマス番号"""
+        return self._cell_at.get(pos, pos)
+
+    def _pos(self, index: int) -> int:
+        """マス番号の配列での位置"""
+        return self._pos_of.get(index, index)
+
+    def _remove_at(self, pos: int) -> int:
+        """配列の位置のマスを末尾と入れ替えて取り除き，そのマス番号を返す"""
+        index = self._cell(pos)
+        last = self._size - 1
+        last_index = self._cell(last)
+        self._place(last_index, pos)
+        self._place(index, last)
+        self._size = last
+        return index
+
+    def _place(self, index: int, pos: int) -> None:
+        """マス番号を配列の位置に置く．元の位置と同じなら記録を消す"""
+        if index == pos:
+            self._cell_at.pop(pos, None)
+            self._pos_of.pop(index, None)
+        else:
+            self._cell_at[pos] = index
+            self._pos_of[index] = pos
+
+
+def bernoulli_indices(
+        n: int,
+        p: float,
+        rng: random.Random | None = None) -> Iterator[int]:
+    """
+    0からn-1の番号を，それぞれ確率pで独立に選んで小さい順に返す関数
+    選ばれなかった番号を幾何分布で一度に読み飛ばすため，
+    乱数を引く回数は選ばれる番号の数に比例し，nによらない．
+
+    Args:
+        n (int): 番号の数
+        p (float): 1つの番号が選ばれる確率
+        rng (random.Random | None): 乱数生成器，Noneならrandomモジュール
+
+    Yields:
+        int: 選ばれた番号
+
+    Examples:
+        >>> list(bernoulli_indices(5, 1.0))
+        [0, 1, 2, 3, 4]
+        >>> list(bernoulli_indices(5, 0.0))
+        []
+        >>> hits = list(bernoulli_indices(100000, 0.01, random.Random(0)))
+        >>> 800 < len(hits) < 1200 and hits == sorted(set(hits))
+        True
+    """
+    if p <= 0:
+        return
+    rng = rng or random
+    log_q = math.log1p(-p) if p < 1 else -math.inf
+    index = -1
+    while True:
+        # 次に選ばれるまでに読み飛ばす数は幾何分布に従う
+        index += 1 + int(math.log(1.0 - rng.random()) / log_q)
+        if index >= n:
+            return
+        yield index
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
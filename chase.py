@@ -0,0 +1,161 @@
+"""プレイヤーを追いかける敵のための距離マップ
+プレイヤーの位置から壁と障害物を避けて幅優先探索し，各マスからプレイヤーまでの歩数を求める．
+距離マップは1ティックに1回(プレイヤーが動いたときだけ)計算し，全ての敵で共有する．
+"""
+import random
+from array import array
+from field import Field
+from bitboard import LAYERS
+
+
+# 敵が選べる方向(停止，右，左，下，上)．`Enemy.get_next_pos`と同じ並び
+DIRECTIONS = ((0, 0), (1, 0), (-1, 0), (0, 1), (0, -1))
+UNREACHABLE = -1  # プレイヤーまでたどり着けないマスの距離
+
+
+class DistanceField:
+    """プレイヤーまでの距離マップ
+    マス(x, y)の距離は`distances[y * f_size + x]`に入る．
+    フィールドの外周は壁として扱う．
+
+    Attributes:
+        f_size (int): フィールドサイズ
+        blocked (bytearray): 壁か障害物があるマスなら1
+        distances (array): 各マスからプレイヤーまでの歩数(UNREACHABLEなら到達不能)
+        sources (frozenset[tuple[int, int]]): 探索の起点にしたプレイヤーの位置
+
+    Examples:
+        >>> from block import Block
+        >>> field = Field([], [], [Block(2, 1), Block(2, 2)], [], [], 5)
+        >>> dist = DistanceField(field)
+        >>> dist.update([(1, 1)])
+        True
+        >>> dist.update([(1, 1)])  # プレイヤーが動いていなければ再計算しない
+        False
+        >>> dist.distance(1, 1), dist.distance(3, 1), dist.distance(0, 0)
+        (0, 6, -1)
+        >>> dist.direction(3, 3)  # 距離が縮む方向(左)へ進む
+        (-1, 0)
+    """
+
+    def __init__(self, field: Field) -> None:
+        """
+        DistanceFieldクラスの初期化をする関数
+        壁と障害物は動かないため，通れないマスはここで一度だけ求める．
+
+        Args:
+            field (Field): フィールド
+        """
+        f_size = field.f_size
+        self.f_size = f_size
+        self.blocked = bytearray(f_size * f_size)
+        for layer in LAYERS:
+            for x, y in field.obstacles.cells(layer):
+                self.blocked[y * f_size + x] = 1
+        # 外周を通れないマスにしておくと，探索で範囲の確認が要らない
+        for i in range(f_size):
+            for cell in (i, (f_size - 1) * f_size + i,
+                         i * f_size, i * f_size + f_size - 1):
+                self.blocked[cell] = 1
+        self._unreached = array("i", [UNREACHABLE]) * (f_size * f_size)
+        self.distances = array("i", self._unreached)
+        self.sources: frozenset[tuple[int, int]] = frozenset()
+
+    def update(self, sources: list[tuple[int, int]]) -> bool:
+        """
+        プレイヤーの位置から距離マップを計算し直すメソッド
+        起点が前回と同じなら何もしない．
+
+        Args:
+            sources (list[tuple[int, int]]): プレイヤーの位置(x, y)のリスト
+
+        Returns:
+            bool: 計算し直した場合はTrue
+        """
+        sources = frozenset(sources)
+        if sources == self.sources:
+            return False
+        self.sources = sources
+        self._search()
+        return True
+
+    def distance(self, x: int, y: int) -> int:
+        """
+        マスからプレイヤーまでの歩数を返すメソッド
+
+        Args:
+            x (int): x座標
+            y (int): y座標
+
+        Returns:
+            int: 歩数．たどり着けないマスやフィールドの外ならUNREACHABLE
+        """
+        if 0 <= x < self.f_size and 0 <= y < self.f_size:
+            return self.distances[y * self.f_size + x]
+        return UNREACHABLE
+
+    def direction(
+            self,
+            x: int,
+            y: int,
+            rng: random.Random | None = None) -> tuple[int, int]:
+        """
+        マスからプレイヤーに最も近づく方向を返すメソッド
+        最も近づく方向が複数あればランダムに選び，
+        プレイヤーにたどり着けないマスにいる場合はランダムな方向を返す．
+
+        Args:
+            x (int): x座標
+            y (int): y座標
+            rng (random.Random | None): 乱数生成器，Noneならrandomモジュール
+
+        Returns:
+            tuple[int, int]: x, y座標の差分
+        """
+        choice = (rng or random).choice
+        if self.distance(x, y) == UNREACHABLE:
+            return choice(DIRECTIONS)
+        best = []
+        best_distance = None
+        for dx, dy in DIRECTIONS:
+            d = self.distance(x + dx, y + dy)
+            if d == UNREACHABLE:
+                continue
+            if best_distance is None or d < best_distance:
+                best = [(dx, dy)]
+                best_distance = d
+            elif d == best_distance:
+                best.append((dx, dy))
+        return choice(best)
+
+    def _search(self) -> None:
+        """起点から幅優先探索で全マスの歩数を求める"""
+        f_size = self.f_size
+        blocked = self.blocked
+        distances = self.distances
+        distances[:] = self._unreached
+        frontier = []
+        for x, y in self.sources:
+            if 0 < x < f_size - 1 and 0 < y < f_size - 1:
+                cell = y * f_size + x
+                if not blocked[cell] and distances[cell] == UNREACHABLE:
+                    distances[cell] = 0
+                    frontier.append(cell)
+        offsets = (1, -1, f_size, -f_size)
+        step = 0
+        while frontier:
+            step += 1
+            next_frontier = []
+            for cell in frontier:
+                for offset in offsets:
+                    neighbor = cell + offset
+                    if not blocked[neighbor] \
+                            and distances[neighbor] == UNREACHABLE:
+                        distances[neighbor] = step
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
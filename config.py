@@ -30,6 +30,17 @@ class Parameters:
     field_size: int = 20  # フィールドサイズの一片を定義する
     enemy_num: int = 10  # 敵の数
     food_num: int = 1  # 食べ物の数
+    player_num: int = 1  # プレイヤーの数
+    headless: bool = False  # Trueなら描画とキー入力なしで最高速で実行する
+    max_ticks: int = 10000  # ヘッドレス実行のティック数の上限(0以下なら上限なし)
+    input_file: str = ''  # ヘッドレス実行の入力ファイル(空ならランダムに入力)
+    enemy_engine: str = 'python'  # 敵を動かす方法('python' か NumPyを使う 'numpy')
+    enemy_policy: str = 'random'  # 敵の動き方('random' か プレイヤーを追いかける 'chase')
+    seed: int = -1  # 乱数のシード(負なら実行ごとにランダムに決める)
+    tick_interval: float = 0.3  # 1ティックの間隔(秒)
+    viewport: bool = False  # プレイヤーの周りのターミナルに収まる範囲だけを描画するかどうか
+    instrument: bool = False  # Trueならゲームループの処理ごとの時間を計測する
+    events: bool = False  # Trueなら移動，衝突，食べ物の取得などのイベントをevents.jsonlに記録する
     # param2: dict = field(default_factory=lambda: {'k1': 'v1', 'k2': 'v2'})
     # リストや辞書で与える例
 
@@ -46,6 +57,10 @@ def common_args(parser: 'ArgumentParser'):
         help="パラメータ設定ファイルのパスを指定．デフォルトはNone",
         type=str,
         default=None)
+    parser.add_argument(
+        "--headless",
+        help="描画とキー入力なしで実行する．パラメータのheadlessより優先",
+        action="store_true")
     # parser.add_argument("-a", "--arg1", type=int, help="arg1の説明", default=0)
     # コマンドライン引数を指定
     # parser.add_argument("--arg2", type=float, help="arg2の説明", default=1.0)
@@ -1,5 +1,9 @@
+from __future__ import annotations
 from item import Item
 import random
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from chase import DistanceField
 
 
 class Enemy(Item):
@@ -18,15 +22,22 @@ class Enemy(Item):
         self.status(bool) : アイテムの状態（Trueなら存在する、Falseなら存在しない消滅した）
     """
 
+    __slots__ = ()
+
     def __init__(self, x, y) -> None:
         super().__init__(x, y)
         self.icon = "👻"
 
-    def get_next_pos(self) -> tuple[int, int]:
+    def get_next_pos(
+            self,
+            rng: random.Random | None = None) -> tuple[int, int]:
         """ランダムに動きたい方向を計算して次の座標を返すメソッド.
         random.choice()を用いて上下左右のいずれかの方向を選択し、
         現在座標に加えて次に移動したい座標を計算する.
 
+        Args:
+            rng (random.Random | None): 乱数生成器，Noneならrandomモジュール
+
         Returns:
             tuple[int, int]: 移動したい座標
 
@@ -36,12 +47,43 @@ class Enemy(Item):
             >>> next_move = enemy.get_next_pos()
             >>> next_move in possible_moves
             True
+            >>> a, b = Enemy(2, 3), Enemy(2, 3)
+            >>> rng_a, rng_b = random.Random(1), random.Random(1)
+            >>> a.get_next_pos(rng_a) == b.get_next_pos(rng_b)
+            True
 
         """
         # 上下左右の方向を表す座標のリスト
         directions = [(0, 0), (1, 0), (-1, 0), (0, 1), (0, -1)]
         # ランダムに方向を選択して次に移動したい座標を計算
-        dir = random.choice(directions)
+        dir = (rng or random).choice(directions)
+        self.next_x = self.now_x + dir[0]
+        self.next_y = self.now_y + dir[1]
+        return (self.next_x, self.next_y)
+
+    def get_chase_pos(
+            self,
+            distances: DistanceField,
+            rng: random.Random | None = None) -> tuple[int, int]:
+        """プレイヤーを追いかける方向を計算して次の座標を返すメソッド.
+        全ての敵で共有する距離マップを引き，プレイヤーに最も近づく座標を次の座標とする.
+
+        Args:
+            distances (DistanceField): プレイヤーまでの距離マップ
+            rng (random.Random | None): 乱数生成器，Noneならrandomモジュール
+
+        Returns:
+            tuple[int, int]: 移動したい座標
+
+        Examples:
+            >>> from field import Field
+            >>> from chase import DistanceField
+            >>> distances = DistanceField(Field([], [], [], [], [], 6))
+            >>> _ = distances.update([(1, 1)])
+            >>> Enemy(1, 3).get_chase_pos(distances)
+            (1, 2)
+        """
+        dir = distances.direction(self.now_x, self.now_y, rng)
         self.next_x = self.now_x + dir[0]
         self.next_y = self.now_y + dir[1]
         return (self.next_x, self.next_y)
@@ -0,0 +1,231 @@
+"""NumPyによる敵の一括移動
+全ての敵の座標をNumPy配列で保持し，移動方向の決定と壁・障害物との衝突処理を
+配列演算でまとめて行うモジュール．敵が数万体いても1ティックの処理を速く保つ．
+"""
+import numpy as np
+from enemy import Enemy
+from wall import Wall
+from block import Block
+from chase import DistanceField
+
+
+# 敵が選ぶ方向(停止，右，左，下，上)．`Enemy.get_next_pos`と同じ並び
+DIRECTIONS = np.array(
+    [(0, 0), (1, 0), (-1, 0), (0, 1), (0, -1)], dtype=np.int32)
+
+
+class EnemyEngine:
+    """敵の一括移動エンジン
+    敵の座標を構造体配列(x座標の配列とy座標の配列)で保持する．
+    衝突の規則は`Field.post_collision_processing`の敵(kind=2)と同じで，
+    壁に当たればその場に留まり，障害物に当たれば`Item.update_special_pos`と同様に
+    2マス先へ跳ね返り，跳ね返り先も壁か障害物ならその場に留まる．
+
+    Attributes:
+        xs (np.ndarray): 敵のx座標
+        ys (np.ndarray): 敵のy座標
+        obstacle (np.ndarray): 壁か障害物があるマス(y, xの順で引く)
+        distance_grid (np.ndarray | None): プレイヤーまでの距離マップ(y, xの順で引く)
+        block (np.ndarray): 障害物があるマス(y, xの順で引く)
+        rng (np.random.Generator): 乱数生成器
+
+    Examples:
+        >>> enemies = [Enemy(1, 1), Enemy(3, 1)]
+        >>> walls = [Wall(0, 1)]
+        >>> blocks = [Block(2, 1)]
+        >>> engine = EnemyEngine(enemies, walls, blocks, 6)
+        >>> engine.move(np.array([2, 2]))  # 壁で止まり，障害物で跳ね返る
+        >>> engine.positions()
+        [(1, 1), (1, 1)]
+        >>> engine.move(np.array([1, 3]))
+        >>> engine.positions()
+        [(3, 1), (1, 2)]
+    """
+
+    def __init__(
+            self,
+            enemies: list[Enemy],
+            walls: list[Wall],
+            blocks: list[Block],
+            f_size: int,
+            rng: np.random.Generator | None = None,
+            distances: DistanceField | None = None,
+            boundary: bool = False) -> None:
+        """
+        EnemyEngineクラスの初期化をする関数
+
+        Args:
+            enemies (list[Enemy]): 敵のリスト
+            walls (list[Wall]): 壁のリスト
+            blocks (list[Block]): 障害物のリスト
+            f_size (int): フィールドサイズ
+            rng (np.random.Generator | None): 乱数生成器
+            distances (DistanceField | None): プレイヤーまでの距離マップ．
+                指定するとプレイヤーを追いかけ，Noneならランダムに動く
+            boundary (bool): Trueなら`walls`になくても外周のマスを壁とする
+        """
+        self.f_size = f_size
+        self.xs = np.array([e.now_x for e in enemies], dtype=np.int32)
+        self.ys = np.array([e.now_y for e in enemies], dtype=np.int32)
+        self.block = np.zeros((f_size, f_size), dtype=bool)
+        for block in blocks:
+            if block.status:
+                self.block[block.now_y, block.now_x] = True
+        self.obstacle = self.block.copy()
+        for wall in walls:
+            if wall.status:
+                self.obstacle[wall.now_y, wall.now_x] = True
+        if boundary:
+            self.obstacle[[0, -1], :] = True
+            self.obstacle[:, [0, -1]] = True
+        self.rng = rng if rng is not None else np.random.default_rng()
+        # 距離マップの配列をコピーせずに2次元配列として参照する
+        self.distance_grid = None
+        if distances is not None:
+            self.distance_grid = np.frombuffer(
+                distances.distances, dtype=np.int32).reshape(f_size, f_size)
+        # 最後に敵のインスタンスへ書き戻した座標
+        self._synced_x = self.xs.copy()
+        self._synced_y = self.ys.copy()
+
+    def step(self) -> None:
+        """
+        全ての敵の移動方向を1回の乱数生成でまとめて決め，移動させるメソッド
+        距離マップがあればプレイヤーを追いかける．
+        """
+        if self.distance_grid is not None:
+            self.chase(self.distance_grid)
+            return
+        self.move(self.rng.integers(0, len(DIRECTIONS), size=len(self.xs)))
+
+    def chase(self, distances: np.ndarray) -> None:
+        """
+        全ての敵をプレイヤーに最も近づく方向へまとめて移動させるメソッド
+        距離が同じ方向は乱数で選び，プレイヤーにたどり着けない敵はランダムに動く．
+
+        Args:
+            distances (np.ndarray): (f_size, f_size)の距離マップ(負なら到達不能)
+
+        Examples:
+            >>> from field import Field
+            >>> from chase import DistanceField
+            >>> dist = DistanceField(Field([], [], [], [], [], 6))
+            >>> _ = dist.update([(1, 1)])
+            >>> grid = np.frombuffer(dist.distances, dtype=np.int32)
+            >>> engine = EnemyEngine([Enemy(1, 3), Enemy(4, 1)], [], [], 6)
+            >>> engine.chase(grid.reshape(6, 6))
+            >>> engine.positions()
+            [(1, 2), (3, 1)]
+        """
+        n = len(self.xs)
+        cand_x = self.xs[:, None] + DIRECTIONS[None, :, 0]
+        cand_y = self.ys[:, None] + DIRECTIONS[None, :, 1]
+        inside = (cand_x >= 0) & (cand_x < self.f_size) \
+            & (cand_y >= 0) & (cand_y < self.f_size)
+        dist = distances[
+            np.clip(cand_y, 0, self.f_size - 1),
+            np.clip(cand_x, 0, self.f_size - 1)].astype(np.float64)
+        dist[~inside | (dist < 0)] = np.inf
+        # 同じ距離の方向からランダムに選ぶため，1未満の乱数を足してから最小を選ぶ
+        choices = np.argmin(
+            dist + self.rng.random((n, len(DIRECTIONS))), axis=1)
+        # たどり着けない敵はランダムに動く
+        lost = np.isinf(dist[np.arange(n), 0])
+        choices[lost] = self.rng.integers(
+            0, len(DIRECTIONS), size=int(lost.sum()))
+        self.move(choices)
+
+    def move(self, choices: np.ndarray) -> None:
+        """
+        敵ごとに選んだ方向へ移動させ，壁と障害物との衝突を配列演算で解決するメソッド
+
+        Args:
+            choices (np.ndarray): 敵ごとの`DIRECTIONS`の添字
+        """
+        dx = DIRECTIONS[choices, 0]
+        dy = DIRECTIONS[choices, 1]
+        next_x = self.xs + dx
+        next_y = self.ys + dy
+        hit_obstacle = self._blocked(next_x, next_y)
+        hit_block = self._at(self.block, next_x, next_y)
+        # 障害物に当たった敵は2マス先へ跳ね返る
+        bounce_x = self.xs + dx * 2
+        bounce_y = self.ys + dy * 2
+        bounced = hit_block & ~self._blocked(bounce_x, bounce_y)
+        # 壁か障害物に当たり，跳ね返れなかった敵はその場に留まる
+        moved = ~hit_obstacle
+        self.xs = np.where(
+            bounced, bounce_x, np.where(moved, next_x, self.xs))
+        self.ys = np.where(
+            bounced, bounce_y, np.where(moved, next_y, self.ys))
+
+    def occupied(self, x: int, y: int) -> bool:
+        """
+        指定したマスに敵がいるかを返すメソッド
+
+        Args:
+            x (int): x座標
+            y (int): y座標
+
+        Returns:
+            bool: 敵がいればTrue
+        """
+        return bool(np.any((self.xs == x) & (self.ys == y)))
+
+    def positions(self) -> list[tuple[int, int]]:
+        """
+        全ての敵の座標をリストで返すメソッド
+
+        Returns:
+            list[tuple[int, int]]: 敵の座標(x, y)のリスト
+        """
+        return list(zip(self.xs.tolist(), self.ys.tolist()))
+
+    def sync(self, enemies: list[Enemy]) -> None:
+        """
+        配列の座標を敵のインスタンスに書き戻すメソッド
+        描画するときだけ呼び出せばよく，動いた敵だけを`update_pos`で更新する．
+
+        Args:
+            enemies (list[Enemy]): 敵のリスト(エンジンの生成時と同じ並び)
+
+        Examples:
+            >>> enemies = [Enemy(1, 1), Enemy(3, 3)]
+            >>> engine = EnemyEngine(enemies, [], [], 6)
+            >>> engine.move(np.array([1, 0]))
+            >>> engine.sync(enemies)
+            >>> enemies[0].get_pos(), enemies[1].get_pos()
+            ((2, 1), (3, 3))
+        """
+        moved = np.flatnonzero(
+            (self._synced_x != self.xs) | (self._synced_y != self.ys))
+        for i, x, y in zip(
+                moved.tolist(),
+                self.xs[moved].tolist(),
+                self.ys[moved].tolist()):
+            enemies[i].next_x = x
+            enemies[i].next_y = y
+            enemies[i].update_pos()
+        self._synced_x = self.xs.copy()
+        self._synced_y = self.ys.copy()
+
+    def _blocked(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """座標が壁か障害物，またはフィールドの外であればTrueとなる配列を返す"""
+        return self._at(self.obstacle, x, y, outside=True)
+
+    def _at(
+            self,
+            mask: np.ndarray,
+            x: np.ndarray,
+            y: np.ndarray,
+            outside: bool = False) -> np.ndarray:
+        """マスクを座標で引く．フィールドの外はoutsideの値とする"""
+        inside = (x >= 0) & (x < self.f_size) & (y >= 0) & (y < self.f_size)
+        values = mask[
+            np.clip(y, 0, self.f_size - 1), np.clip(x, 0, self.f_size - 1)]
+        return np.where(inside, values, outside)
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,272 @@
+"""学習用の環境
+エージェントの学習のために，描画とキー入力なしのゲームをGym形式の`reset`と`step`で
+進められるようにするモジュール．`VectorEnv`は独立したK個のゲームを1回の呼び出しで進め，
+観測，報酬，終了フラグをNumPy配列にまとめて返す．
+
+観測はフィールドの型付きのマス目(`Field.cell_ids`)をチャンネル(`CHANNELS`)ごとの0/1に
+展開したもので，形は(チャンネル, y, x)．1つのマスは描画と同じく最も優先されるアイテムの
+チャンネルだけが1になる(食べ物，敵，障害物，壁，プレイヤーの順)．
+行動は`ACTIONS`の添字(0: 停止，1: 上，2: 左，3: 下，4: 右)．
+報酬は食べ物を1つ取るごとに+1(ステージの最後の食べ物も含む)，敵に当たると-1，それ以外は0．
+"""
+import random
+from dataclasses import replace
+import numpy as np
+from config import Parameters
+from field import CHANNELS
+from game import Game, GAME_OVER, NEXT_STAGE
+from replay import KEYS
+
+
+ACTIONS = KEYS  # 行動の番号 -> キー(リプレイと同じ並び)
+PLAYER, WALL, BLOCK, ENEMY, FOOD = range(len(CHANNELS))
+
+
+class PacmanEnv:
+    """1つのゲームの環境
+    `step`は`Game.step`で1ティック進め，ステージをクリアしたら`Game.next_stage`で次のステージを始める．
+    敵に当たると終了(terminated)，`max_ticks`に達すると打ち切り(truncated)とする．
+    プレイヤーは1人とする．
+
+    Attributes:
+        params (Parameters): ゲームのパラメータ
+        game (Game): 実行中のゲーム
+        ticks (int): エピソードの開始からのティック数
+        observation_shape (tuple[int, int, int]): 観測の形(チャンネル, y, x)
+
+    Examples:
+        >>> env = PacmanEnv(Parameters(field_size=8, enemy_num=0, max_ticks=3))
+        >>> obs, info = env.reset(seed=1)
+        >>> obs.shape, obs.dtype, int(obs[PLAYER].sum())
+        ((5, 8, 8), dtype('uint8'), 1)
+        >>> bool(obs[WALL, 0].all()), int(obs[WALL, 1, 1])
+        (True, 0)
+        >>> for action in (4, 3, 0):
+        ...     obs, reward, terminated, truncated, info = env.step(action)
+        >>> truncated or terminated
+        True
+        >>> params = Parameters(field_size=6, enemy_num=0, food_num=3)
+        >>> env = PacmanEnv(params)
+        >>> _ = env.reset(seed=0)
+        >>> _, reward, _, _, info = env.step(3)  # ステージの途中の食べ物でも+1
+        >>> reward, info["stages_cleared"]
+        (1.0, 0)
+    """
+
+    def __init__(self, params: Parameters | None = None) -> None:
+        """
+        PacmanEnvクラスの初期化をする関数
+
+        Args:
+            params (Parameters | None): ゲームのパラメータ，Noneならデフォルト
+        """
+        self.params = replace(
+            params or Parameters(), headless=True, player_num=1)
+        size = self.params.field_size
+        self.observation_shape = (len(CHANNELS), size, size)
+        self.game: Game | None = None
+        self.ticks = 0
+        self._seeds = random.Random()
+
+    def reset(self, seed: int | None = None) -> tuple[np.ndarray, dict]:
+        """
+        新しいエピソードを始めるメソッド
+
+        Args:
+            seed (int | None): このエピソードのシード．Noneなら環境の乱数から決める
+
+        Returns:
+            tuple[np.ndarray, dict]: 最初の観測と情報
+        """
+        if seed is not None:
+            self._seeds.seed(seed)
+        params = replace(self.params, seed=self._seeds.getrandbits(32))
+        self.game = Game(params, autostart=False)
+        self.ticks = 0
+        return self.observe(), self.info()
+
+    def step(self, action: int) -> tuple[np.ndarray, float, bool, bool, dict]:
+        """
+        行動をとって1ティック進めるメソッド
+
+        Args:
+            action (int): 行動の番号
+
+        Returns:
+            tuple: 観測，報酬，終了したか，打ち切られたか，情報
+        """
+        reward, terminated, truncated = self.advance(action)
+        return self.observe(), reward, terminated, truncated, self.info()
+
+    def advance(self, action: int) -> tuple[float, bool, bool]:
+        """
+        観測を作らずに1ティック進めるメソッド
+
+        Args:
+            action (int): 行動の番号
+
+        Returns:
+            tuple[float, bool, bool]: 報酬，終了したか，打ち切られたか
+        """
+        game = self.game
+        foods = sum(food.status for food in game.foods)
+        outcome = game.step([ACTIONS[action]])
+        self.ticks += 1
+        if outcome == GAME_OVER:
+            return -1.0, True, False
+        # 食べ物を取ったかは，残っている食べ物の数の差で分かる
+        reward = float(foods - sum(food.status for food in game.foods))
+        if outcome == NEXT_STAGE:
+            game.next_stage(game.params)
+        max_ticks = self.params.max_ticks
+        return reward, False, 0 < max_ticks <= self.ticks
+
+    def observe(self, out: np.ndarray | None = None) -> np.ndarray:
+        """
+        今のフィールドの観測を作るメソッド
+        フィールドの型付きのマス目(`Field.cell_ids`)をチャンネルに展開する．
+
+        Args:
+            out (np.ndarray | None): 書き込む配列，Noneなら新しく作る
+
+        Returns:
+            np.ndarray: 観測
+        """
+        if out is None:
+            out = np.empty(self.observation_shape, dtype=np.uint8)
+        return self.game.field.one_hot(out)
+
+    def info(self) -> dict:
+        """
+        エピソードの情報を返すメソッド
+
+        Returns:
+            dict: クリアしたステージ数とティック数
+        """
+        return {"stages_cleared": self.game.clear_count, "ticks": self.ticks}
+
+
+class VectorEnv:
+    """独立したK個のゲームをまとめて進める環境
+    `step`は全てのゲームを1ティックずつ進め，観測をまとめて1つの配列に書き込む．
+    終わったゲームはその場で新しいエピソードを始め(自動リセット)，
+    返す観測は新しいエピソードの最初の観測とする．終わったときの観測は
+    `info["final_observation"]`に入る．
+
+    Attributes:
+        envs (list[PacmanEnv]): ゲームごとの環境
+        num_envs (int): ゲームの数
+
+    Examples:
+        >>> params = Parameters(field_size=8, enemy_num=0, max_ticks=2)
+        >>> venv = VectorEnv(params, 3)
+        >>> obs, info = venv.reset(seed=0)
+        >>> obs.shape
+        (3, 5, 8, 8)
+        >>> obs, rewards, terminated, truncated, info = venv.step([4, 3, 0])
+        >>> rewards.shape, terminated.dtype
+        ((3,), dtype('bool'))
+        >>> obs, rewards, terminated, truncated, info = venv.step([4, 3, 0])
+        >>> bool((terminated | truncated).all())  # 2ティックで全て終わる
+        True
+        >>> info["final_observation"].shape, info["ticks"].tolist()
+        ((3, 5, 8, 8), [0, 0, 0])
+    """
+
+    def __init__(self, params: Parameters | None, num_envs: int) -> None:
+        """
+        VectorEnvクラスの初期化をする関数
+
+        Args:
+            params (Parameters | None): ゲームのパラメータ，Noneならデフォルト
+            num_envs (int): ゲームの数
+        """
+        self.envs = [PacmanEnv(params) for _ in range(num_envs)]
+        self.num_envs = num_envs
+
+    def reset(self, seed: int | None = None) -> tuple[np.ndarray, dict]:
+        """
+        全てのゲームで新しいエピソードを始めるメソッド
+
+        Args:
+            seed (int | None): シード．i番目のゲームはseed + iを使う
+
+        Returns:
+            tuple[np.ndarray, dict]: 最初の観測(K, チャンネル, y, x)と情報
+        """
+        for i, env in enumerate(self.envs):
+            env.reset(None if seed is None else seed + i)
+        return self.observe(), self.info()
+
+    def step(self, actions) -> tuple[
+            np.ndarray, np.ndarray, np.ndarray, np.ndarray, dict]:
+        """
+        全てのゲームを1ティック進めるメソッド
+
+        Args:
+            actions: ゲームごとの行動の番号(長さKの配列かリスト)
+
+        Returns:
+            tuple: 観測(K, チャンネル, y, x)，報酬(K)，終了したか(K)，
+                打ち切られたか(K)，情報
+        """
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        terminated = np.zeros(self.num_envs, dtype=bool)
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            rewards[i], terminated[i], truncated[i] = env.advance(int(action))
+        obs = self.observe()
+        done = np.flatnonzero(terminated | truncated)
+        if len(done) == 0:
+            return obs, rewards, terminated, truncated, self.info()
+        # 終わったときの観測と結果を残してから，新しいエピソードを始める
+        final = obs.copy()
+        stages = np.zeros(self.num_envs, dtype=np.int64)
+        for i in done:
+            stages[i] = self.envs[i].game.clear_count
+            self.envs[i].reset()
+        self.observe(obs, done)
+        info = self.info()
+        info["final_observation"] = final
+        info["final_stages_cleared"] = stages
+        return obs, rewards, terminated, truncated, info
+
+    def observe(
+            self,
+            out: np.ndarray | None = None,
+            indices: np.ndarray | None = None) -> np.ndarray:
+        """
+        ゲームの観測を1つの配列にまとめて作るメソッド
+        ゲームごとの型付きのマス目を，配列の中のそのゲームの位置に直接展開する．
+
+        Args:
+            out (np.ndarray | None): 書き込む配列，Noneなら新しく作る
+            indices (np.ndarray | None): 作り直すゲームの番号，Noneなら全て
+
+        Returns:
+            np.ndarray: 観測(K, チャンネル, y, x)
+        """
+        if out is None:
+            shape = self.envs[0].observation_shape
+            out = np.empty((self.num_envs, *shape), dtype=np.uint8)
+        for i in range(self.num_envs) if indices is None else indices:
+            self.envs[i].observe(out[i])
+        return out
+
+    def info(self) -> dict:
+        """
+        ゲームごとの情報を配列にまとめて返すメソッド
+
+        Returns:
+            dict: ゲームごとのクリアしたステージ数とティック数
+        """
+        return {
+            "stages_cleared": np.array(
+                [env.game.clear_count for env in self.envs]),
+            "ticks": np.array([env.ticks for env in self.envs]),
+        }
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
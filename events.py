@@ -0,0 +1,106 @@
+"""ゲームのイベントの記録
+ティックごとの移動，敵との衝突，食べ物の取得などのイベントをJSONL形式でファイルに書き出すモジュール．
+イベントはメモリにためておき，一定の数がたまるか一定の時間が経つとまとめて書き出すため，
+ゲームループでイベントごとにファイルへ書き込むことはない．
+"""
+import json
+import time
+from typing import Any, Callable
+
+
+class EventWriter:
+    """イベントをJSONL形式で書き出すクラス
+    1行に1つのイベントを`{"tick": ティック, "event": 種類, ...}`の形で書く．
+
+    Attributes:
+        path (str): 書き出し先のパス
+        batch_size (int): この数だけたまったら書き出す
+        flush_interval (float): 前回の書き出しからこの秒数が経ったら書き出す
+        count (int): 受け取ったイベントの数
+
+    Examples:
+        >>> import os
+        >>> import tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), "events.jsonl")
+        >>> writer = EventWriter(path, batch_size=2)
+        >>> writer.emit(0, "move", player=0, pos=[1, 2])
+        >>> open(path).read()  # 1つ目はまだ書き出さない
+        ''
+        >>> writer.emit(3, "pickup", player=0, pos=[2, 2])
+        >>> writer.emit(5, "collision", player=0, pos=[2, 3])
+        >>> writer.close()
+        >>> print(open(path).read(), end="")
+        {"tick":0,"event":"move","player":0,"pos":[1,2]}
+        {"tick":3,"event":"pickup","player":0,"pos":[2,2]}
+        {"tick":5,"event":"collision","player":0,"pos":[2,3]}
+    """
+
+    def __init__(
+            self,
+            path: str,
+            batch_size: int = 4096,
+            flush_interval: float = 1.0,
+            clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        EventWriterクラスの初期化をする関数
+
+        Args:
+            path (str): 書き出し先のパス
+            batch_size (int): この数だけたまったら書き出す
+            flush_interval (float): 前回の書き出しからこの秒数が経ったら書き出す
+            clock (Callable[[], float]): 現在時刻(秒)を返す関数
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.count = 0
+        self._clock = clock
+        self._file = open(path, "w", encoding="utf-8")
+        self._pending: list[dict[str, Any]] = []
+        self._last_flush = clock()
+
+    def emit(self, tick: int, event: str, **data: Any) -> None:
+        """
+        イベントを1つ記録するメソッド
+
+        Args:
+            tick (int): イベントが起きたティック
+            event (str): イベントの種類
+            **data (Any): イベントの内容(jsonにできる値)
+        """
+        self._pending.append({"tick": tick, "event": event, **data})
+        self.count += 1
+        if len(self._pending) >= self.batch_size \
+                or self._clock() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """ためているイベントをまとめて書き出すメソッド"""
+        if self._pending:
+            self._file.write("".join(
+                json.dumps(event, separators=(",", ":")) + "\n"
+                for event in self._pending))
+            self._file.flush()
+            self._pending.clear()
+        self._last_flush = self._clock()
+
+    def close(self) -> None:
+        """残りのイベントを書き出してファイルを閉じるメソッド"""
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+class NullEventWriter:
+    """イベントを記録しない場合に使う，何もしないEventWriter"""
+
+    def emit(self, tick: int, event: str, **data: Any) -> None:
+        """何もしない"""
+
+    def close(self) -> None:
+        """何もしない"""
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
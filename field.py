@@ -1,9 +1,52 @@
 from item import Item
 from player import Player
-from wall import Wall
+from wall import Wall, ICON as WALL_ICON
 from block import Block
 from enemy import Enemy
 from food import Food
+from occupancy import OccupancyIndex
+from grid import SparseGrid, BLANK, display_width
+from bitboard import ObstacleBoard
+from typing import Iterable, TYPE_CHECKING
+if TYPE_CHECKING:
+    import numpy as np
+
+
+# フィールドの上に表示する操作方法
+HELP_LINES = (
+    "w: 1マス上に移動",
+    "a: 1マス左に移動",
+    "s: 1マス下に移動",
+    "d: 1マス右に移動",
+)
+
+# 型付きのマス目の値(マスの種類)と，種類ごとのアイコン(パレット)
+CELL_KINDS = (
+    "blank", "player", "wall", "block", "enemy", "food",
+    "player_good", "player_bad")
+PALETTE = (BLANK, "😶", WALL_ICON, "🗻", "👻", "🍒", "😊", "😭")
+KIND_IDS = {kind: i for i, kind in enumerate(CELL_KINDS)}
+ICON_IDS = {icon: i for i, icon in enumerate(PALETTE)}
+# one-hotのチャンネル．プレイヤーの顔の違いは同じチャンネルにまとめる
+CHANNELS = ("player", "wall", "block", "enemy", "food")
+KIND_CHANNELS = (-1, 0, 1, 2, 3, 4, 0, 0)  # マスの種類 -> チャンネル(-1はなし)
+_ONE_HOT_TABLE = None  # one_hot_tableの結果(NumPyは使うときに読み込む)
+
+
+def one_hot_table() -> "np.ndarray":
+    """
+    チャンネル x マスの種類の0/1の表を返す関数．マスの種類の列を引くとone-hotになる
+
+    Examples:
+        >>> one_hot_table()[:, KIND_IDS["player_good"]].tolist()
+        [1, 0, 0, 0, 0]
+    """
+    global _ONE_HOT_TABLE
+    if _ONE_HOT_TABLE is None:
+        import numpy as np
+        _ONE_HOT_TABLE = (np.arange(len(CHANNELS))[:, None]
+                          == np.array(KIND_CHANNELS)).astype(np.uint8)
+    return _ONE_HOT_TABLE
 
 
 class Field:
@@ -17,8 +60,17 @@ class Field:
         blocks (list[Block]): アイテムのリスト
         enemies (list[Enemy]): 敵の情報
         weapons (list[Weapon]): 武器情報
-        fields (list[list[str]]): フィールド情報
+        field (SparseGrid): フィールド情報(アイテムのあるマスだけを持つ)
         field_size (int): フィールドサイズ
+        occupancy (dict[str, OccupancyIndex]): レイヤごとの占有インデックス
+        obstacles (ObstacleBoard): 動かない壁と障害物のビットボード
+        dirty (set[tuple[int, int]]): 前回の描画から変化したマス
+        redraw (bool): 全体を描き直す必要があるかどうか
+        boundary (bool): 外周を`Wall`なしで壁として扱うかどうか
+
+    マス目は文字列の`field`のほかに，マスごとの種類(`CELL_KINDS`の添字)を1バイトで持つ
+    型付きのマス目を`cell_ids`で読める．最初に読んだときに作り，それ以降は`field`と一緒に更新する．
+    `field`を更新しないヘッドレス実行では，`update_ids`で型付きのマス目だけを更新する．
     """
 
     # フィールドを生成する関数
@@ -29,7 +81,8 @@ class Field:
             blocks: list[Block],
             enemies: list[Enemy],
             foods: list[Food],
-            f_size: int = 6):
+            f_size: int = 6,
+            boundary: bool = False):
 
         """
         Fieldクラスの初期化をする関数
@@ -41,26 +94,91 @@ class Field:
             enemies (list[Enemy]): 敵の情報
             weapons (list[weapon]): 武器情報
             field_size (int): フィールドサイズ
+            boundary (bool): Trueなら外周を壁とする．外周の壁は`Wall`を作らずに，
+                衝突は座標の範囲で判定し，表示はあらかじめ作った外周の行と列を使う．
+                `walls`にはフィールドの内側の壁だけを渡せばよい
         """
 
         self.f_size = f_size
-        self.field = [[" " for _ in range(f_size)] for _ in range(f_size)]
+        self.boundary = boundary
+        self.field = SparseGrid(f_size, WALL_ICON if boundary else None)
         self.players = players
         self.walls = walls
         self.blocks = blocks
         self.enemies = enemies
         self.foods = foods
+        # レイヤごとに座標からアイテムを引く占有インデックスを作成
+        self.occupancy = {
+            "player": OccupancyIndex(players),
+            "wall": OccupancyIndex(walls),
+            "block": OccupancyIndex(blocks),
+            "enemy": OccupancyIndex(enemies),
+            "food": OccupancyIndex(foods),
+        }
+        # 壁と障害物は動かないため，衝突判定用にビットボードにしておく
+        self.obstacles = ObstacleBoard(f_size, walls, blocks, boundary)
+
+        # 前回の描画で動くアイテムがいたマスと，描画後に変化したマス
+        self._moving_cells: set[tuple[int, int]] = set()
+        self.dirty: set[tuple[int, int]] = set()
+        self.redraw = False
+        # 型付きのマス目(y * f_size + xバイト目がマスの種類)．`cell_ids`で初めて作る
+        self._ids: bytearray | None = None
+        # 型付きのマス目に動くアイテムを描いた位置 -> 描く前の背景の値
+        self._id_cells: dict[int, int] = {}
 
         # それぞれのアイテムの位置をFieldに更新する関数
-        self.update_field()
+        self.rebuild_field()
+        # 生成直後のフィールドは描画側で全体を描くため，変化の記録は不要
+        self.redraw = False
+
+    def rebuild_field(self) -> SparseGrid:
+
+        """
+        フィールド全体を空白にしてから，全てのアイテムを配置し直す関数
+        アイテムの座標を`update_pos`を通さずに書き換えた場合などに用いる．
+        マスを1つずつ記録する代わりに，全体の描き直しを`redraw`で知らせる．
+
+        Returns:
+            SparseGrid: 更新されたフィールド
+
+        Examples:
+            >>> p = [Player(1, 0)]
+            >>> field = Field(p, [], [], [], [], 3)
+            >>> sorted(field.take_dirty()), field.redraw
+            ([], False)
+            >>> field.rebuild_field()[0]
+            ['\u3000', '😶', '\u3000']
+            >>> field.redraw
+            True
+        """
+
+        # フィールドを全て空白にする
+        self.field.clear()
+        # フィールドを更新する処理を記述
+        for layer in (
+                self.players, self.walls, self.blocks,
+                self.enemies, self.foods):
+            for item in layer:
+                if item.status:
+                    self.field.set(item.now_x, item.now_y, item.icon)
+        if self._ids is not None:
+            self._paint_ids()
+        # 動くアイテムの位置を記録し，全体を描き直す必要があるとする
+        self._moving_cells = self._current_moving_cells()
+        self.dirty = set()
+        self.redraw = True
+        return self.field
 
-    def update_field(self) -> list[list[str]]:
+    def update_field(self) -> SparseGrid:
 
         """
         プレイヤー，敵，物体の位置を参照して，フィールドを更新する関数
+        壁と障害物は動かないため，前回と今回の動くアイテム(プレイヤー，敵，食べ物)の
+        位置のマスだけを描き直す．描き直して変化したマスは`dirty`に記録する．
 
         Returns:
-            list[list[str]]: 更新されたフィールド
+            SparseGrid: 更新されたフィールド
 
         Examples:
             >>> p = [Player(1, 0)]
@@ -83,35 +201,206 @@ class Field:
             >>> field.update_field()[0]
             ['w1', 'p1', 'e1']
             >>> field.update_field()[1]
-            ['f1', 'e2', '\\u3000']
+            ['f1', 'e2', '\u3000']
             >>> field.update_field()[2]
-            ['b1', 'b2', '\\u3000']
+            ['b1', 'b2', '\u3000']
+            >>> _ = field.take_dirty()
+            >>> e2.next_x = 2
+            >>> e2.update_pos()
+            >>> field.update_field()[1]
+            ['f1', '\u3000', 'e2']
+            >>> sorted(field.take_dirty())
+            [(1, 1), (2, 1)]
         """
 
-        # フィールドの最大サイズを保存
-        max_size = len(self.field)
-        # フィールドを全て空白にする
-        for i in range(max_size):
-            for j in range(max_size):
-                self.field[i][j] = "　"
-        # フィールドを更新する処理を記述
-        for player in self.players:
-            if player.status:
-                self.field[player.now_y][player.now_x] = player.icon
-        for wall in self.walls:
-            if wall.status:
-                self.field[wall.now_y][wall.now_x] = wall.icon
-        for block in self.blocks:
-            if block.status:
-                self.field[block.now_y][block.now_x] = block.icon
-        for enemy in self.enemies:
-            if enemy.status:
-                self.field[enemy.now_y][enemy.now_x] = enemy.icon
-        for food in self.foods:
-            if food.status:
-                self.field[food.now_y][food.now_x] = food.icon
+        current = self._current_moving_cells()
+        # 前回または今回動くアイテムがいたマスだけを描き直す
+        for x, y in self._moving_cells | current:
+            icon = self.cell_icon(x, y)
+            if self.field.get(x, y) != icon:
+                self.field.set(x, y, icon)
+                self.dirty.add((x, y))
+        self._moving_cells = current
+        self.update_ids()
         return self.field
 
+    def update_ids(
+            self,
+            enemy_cells: Iterable[tuple[int, int]] | None = None) -> None:
+
+        """
+        型付きのマス目の，前回と今回の動くアイテムのマスだけを描き直す関数
+        型付きのマス目をまだ作っていなければ何もしない．
+        敵の座標が敵のインスタンスに書き戻されていない場合(NumPyのエンジン)は`enemy_cells`で渡す．
+
+        Args:
+            enemy_cells (Iterable[tuple[int, int]] | None): 敵のいるマス，
+                Noneなら敵のインスタンスから読む
+
+        Examples:
+            >>> field = Field([Player(1, 1)], [], [], [Enemy(2, 2)], [], 4)
+            >>> ids = field.cell_ids()
+            >>> field.update_ids([(1, 2)])  # 敵のインスタンスは(2, 2)のまま
+            >>> ids[2, 1], ids[2, 2]
+            (4, 0)
+        """
+        ids = self._ids
+        if ids is None:
+            return
+        # 前回動くアイテムを描いたマスを，動かない背景に戻してから描き直す
+        for i, kind in self._id_cells.items():
+            ids[i] = kind
+        self._paint_moving(enemy_cells)
+
+    def cell_icon(self, x: int, y: int) -> str:
+
+        """
+        占有インデックスを参照して，マスに表示するアイコンを返す関数
+        `rebuild_field`と同じく，食べ物，敵，障害物，壁，プレイヤーの順に優先する．
+
+        Args:
+            x (int): x座標
+            y (int): y座標
+
+        Returns:
+            str: マスに表示するアイコン
+
+        Examples:
+            >>> field = Field([Player(1, 1)], [], [], [Enemy(1, 1)], [], 3)
+            >>> field.cell_icon(1, 1)
+            '👻'
+            >>> field.cell_icon(0, 0)
+            '\u3000'
+            >>> Field([], [], [], [], [], 3, boundary=True).cell_icon(0, 0)
+            '⚪'
+        """
+        for name in ("food", "enemy", "block", "wall", "player"):
+            for item in self.occupancy[name].items_at(x, y):
+                if item.status:
+                    return item.icon
+        # どのアイテムもいなければ，外周の壁か空白
+        return self.field.background(x, y)
+
+    def cell_ids(self) -> memoryview:
+
+        """
+        マスごとの種類(`CELL_KINDS`の添字)を並べた型付きのマス目を返す関数
+        返すのは`field`と一緒に更新されるバッファの(y, x)の形のmemoryviewで，複製ではない．
+        NumPyでは`np.asarray(field.cell_ids())`で複製せずに配列として読める．
+        最初に呼ばれたときにバッファを作るため，使わなければメモリを使わない．
+
+        Returns:
+            memoryview: 型付きのマス目(uint8，形は(f_size, f_size))
+
+        Examples:
+            >>> p = Player(1, 1)
+            >>> field = Field([p], [], [], [], [Food(2, 1)], 4, boundary=True)
+            >>> ids = field.cell_ids()
+            >>> ids.shape, ids.tolist()[1]
+            ((4, 4), [2, 1, 5, 2])
+            >>> p.next_y = 2
+            >>> p.update_pos()
+            >>> _ = field.update_field()
+            >>> [ids[1, 1], ids[2, 1]]  # 同じバッファが更新される
+            [0, 1]
+            >>> "".join(PALETTE[i] for i in ids.tolist()[2])
+            '⚪😶\u3000⚪'
+        """
+        if self._ids is None:
+            self._ids = bytearray(self.f_size * self.f_size)
+            self._paint_ids()
+        if not self._ids:
+            return memoryview(self._ids)
+        return memoryview(self._ids).cast("B", (self.f_size, self.f_size))
+
+    def one_hot(self, out: "np.ndarray | None" = None) -> "np.ndarray":
+
+        """
+        型付きのマス目をone-hotのチャンネル(`CHANNELS`)に展開した配列を返す関数
+        チャンネルに展開するため，この配列は複製になる．
+
+        Args:
+            out (np.ndarray | None): 書き込む配列(uint8，形は(チャンネル, f_size, f_size))，
+                Noneなら新しく作る
+
+        Returns:
+            np.ndarray: 0/1の配列(uint8，形は(チャンネル, f_size, f_size))
+
+        Examples:
+            >>> field = Field([Player(1, 1)], [], [], [Enemy(2, 2)], [], 4)
+            >>> planes = field.one_hot()
+            >>> planes.shape, int(planes[0, 1, 1]), int(planes[3, 2, 2])
+            ((5, 4, 4), 1, 1)
+        """
+        import numpy as np
+        ids = np.asarray(self.cell_ids()).reshape(self.f_size, self.f_size)
+        return np.take(one_hot_table(), ids, axis=1, out=out)
+
+    def _paint_ids(self) -> None:
+        """型付きのマス目を，壁と障害物のビットボードと動くアイテムから描き直す"""
+        ids = self._ids
+        # 動かない背景はマスの種類を1文字としてビットボードから描き，まとめて書き込む
+        kinds = {
+            layer: chr(KIND_IDS[layer]) for layer in ("wall", "block")}
+        background = self.obstacles.background(kinds, chr(KIND_IDS["blank"]))
+        ids[:] = "".join(background).encode("latin-1")
+        self._paint_moving()
+
+    def _paint_moving(
+            self,
+            enemy_cells: Iterable[tuple[int, int]] | None = None) -> None:
+        """型付きのマス目に動くアイテムを描き，描いた位置を記録する"""
+        ids = self._ids
+        f_size = self.f_size
+        painted = {}
+        # cell_iconと同じく，プレイヤーは他のアイテムのいないマスにだけ描き，
+        # 敵，食べ物の順に上書きする
+        kind = KIND_IDS["player"]
+        for p in self.players:
+            x, y = p.now_x, p.now_y
+            if p.status and 0 <= x < f_size and 0 <= y < f_size:
+                i = y * f_size + x
+                painted.setdefault(i, ids[i])
+                if not ids[i]:
+                    ids[i] = ICON_IDS.get(p.icon, kind)
+        if enemy_cells is None:
+            enemy_cells = [
+                (enemy.now_x, enemy.now_y)
+                for enemy in self.enemies if enemy.status]
+        kind = KIND_IDS["enemy"]
+        for x, y in enemy_cells:
+            if 0 <= x < f_size and 0 <= y < f_size:
+                i = y * f_size + x
+                painted.setdefault(i, ids[i])
+                ids[i] = kind
+        kind = KIND_IDS["food"]
+        for f in self.foods:
+            x, y = f.now_x, f.now_y
+            if f.status and 0 <= x < f_size and 0 <= y < f_size:
+                i = y * f_size + x
+                painted.setdefault(i, ids[i])
+                ids[i] = ICON_IDS.get(f.icon, kind)
+        self._id_cells = painted
+
+    def take_dirty(self) -> set[tuple[int, int]]:
+
+        """
+        前回呼び出されてから変化したマスの集合を返し，記録を空にする関数
+
+        Returns:
+            set[tuple[int, int]]: 変化したマスの座標(x, y)の集合
+        """
+        dirty = self.dirty
+        self.dirty = set()
+        return dirty
+
+    def _current_moving_cells(self) -> set[tuple[int, int]]:
+        """動くアイテム(プレイヤー，敵，食べ物)のいるマスの集合を返す"""
+        return {
+            (item.now_x, item.now_y)
+            for layer in (self.players, self.enemies, self.foods)
+            for item in layer}
+
     # フィールドを表示する関数
     def display_field(self) -> None:
 
@@ -147,19 +436,17 @@ class Field:
         """
 
         # 動き方を表示
-        print("w: 1マス上に移動")
-        print("a: 1マス左に移動")
-        print("s: 1マス下に移動")
-        print("d: 1マス右に移動")
+        for line in HELP_LINES:
+            print(line)
 
         # self.fieldを表示する処理を記述
-        max_width = max(len(row) for row in self.field)
+        # 絵文字と全角空白は2マス分の幅で表示されるため，表示幅で行をそろえる
+        lines = ["".join(row) for row in self.field]
+        max_width = max(map(display_width, lines), default=0)
 
-        for row in self.field:
-            # 各行の文字列を作成し，不足部分を空白で埋める
-            row_str = "".join(row)
-            row_str = row_str.ljust(max_width)
-            print(row_str)
+        for line in lines:
+            # 不足部分を空白で埋める
+            print(line + " " * (max_width - display_width(line)))
 
     # 衝突判定をする関数
     def collision(
@@ -169,6 +456,8 @@ class Field:
 
         """
         プレイヤー，敵，物体の位置が重なっているか判定する関数
+        itemsがフィールドの持つレイヤのリストであれば占有インデックスを引き，
+        それ以外のリストであれば先頭から順に調べる．
             Args:
             target (Item): アイテム1
             items (list[Item]): アイテム2
@@ -188,26 +477,64 @@ class Field:
             >>> r = field.collision(p, [e])
             >>> r is e
             True
+            >>> field.collision(p, field.enemies) is e
+            True
         """
 
+        # フィールドのレイヤであれば占有インデックスで判定
+        layer = self.layer_index(items)
+        if layer is not None:
+            return layer.get(target.next_x, target.next_y)
         # 衝突判定をする処理を記述
         for item in items:
             if item.next_x == target.next_x and item.next_y == target.next_y:
                 return item
         return None
 
+    def layer_index(self, items: list[Item]) -> OccupancyIndex | None:
+        """
+        リストに対応する占有インデックスを返す関数
+
+        Args:
+            items (list[Item]): フィールドの持つレイヤのリスト
+
+        Returns:
+            OccupancyIndex | None: 対応する占有インデックス，なければNone
+
+        Examples:
+            >>> w = [Wall(0, 0)]
+            >>> field = Field([], w, [], [], [], 3)
+            >>> field.layer_index(w) is field.occupancy["wall"]
+            True
+            >>> field.layer_index(list(w)) is None
+            True
+        """
+        layers = (
+            ("player", self.players),
+            ("wall", self.walls),
+            ("block", self.blocks),
+            ("enemy", self.enemies),
+            ("food", self.foods),
+        )
+        for name, layer in layers:
+            if items is layer:
+                return self.occupancy[name]
+        return None
+
     # 特別な衝突処理をする関数
     def post_collision_processing(
             self,
             items: list[Item],
-            kind: int = 1,
-            collision_count: int = 0) -> None:
+            kind: int = 1) -> None:
         """
         プレイヤー，敵，物体の位置が重なっているか判定する関数
+        全てのアイテムの移動先を1回の走査で決める．
+        プレイヤーは壁に当たると反対側へ回り込み，障害物に当たるとその場に留まる．
+        敵は障害物に当たると跳ね返り，壁に当たるとその場に留まる．
+        回り込み先や跳ね返り先も壁か障害物なら，その場に留まる．
             Args:
             items (list[Item]): アイテム
             kind (int = 1): プレイヤーか敵のどちらが呼び出されたかを判別
-            collision_count (int = 0): この関数が呼び出された回数
 
         Returns:
             None
@@ -238,34 +565,39 @@ class Field:
             >>> field.post_collision_processing([e], 2)
             >>> e.next_x == 3
             True
+            >>> e1, e2 = Enemy(3, 1), Enemy(3, 2)
+            >>> field = Field([], w, b, [e1, e2], [], 6)
+            >>> e1.next_x = e2.next_x = 2  # どちらも障害物を跳び越える
+            >>> field.post_collision_processing([e1, e2], 2)
+            >>> e1.get_pos(), e2.get_pos()
+            ((1, 1), (1, 2))
         """
 
-        for item in items:
-            # 障害物，壁との衝突判定
-            collided_block = self.collision(item, list(self.blocks))
-            collided_wall = self.collision(item, list(self.walls))
-            # プレイヤーが壁に衝突した場合
-            if collided_wall and kind == 1:
-                item.update_special_pos(int(len(self.field)), kind)
-                self.post_collision_processing(list(items), kind)
-            # 敵が障害物に衝突した場合
-            elif collided_block and kind == 2:
-                # 複数回衝突した場合
-                if collision_count > 0:
-                    item.update_pos(stuck=True)
-                # 初めて障害物に衝突した場合
-                else:
-                    collision_count = collision_count + 1
-                    item.update_special_pos(int(len(self.field)), kind)
-                    self.post_collision_processing(list(items),
-                                                   kind,
-                                                   collision_count)
+        # 障害物，壁との衝突判定(全てのアイテムの移動先をビットボードでまとめて調べる)
+        targets = [(item.next_x, item.next_y) for item in items]
+        wall_hits = self.obstacles.hits("wall", targets)
+        block_hits = self.obstacles.hits("block", targets)
+        rerouted = []
+        for item, collided_wall, collided_block in zip(
+                items, wall_hits, block_hits):
+            # プレイヤーが壁に，敵が障害物に衝突した場合は移動先を変える
+            if collided_wall and kind == 1 or collided_block and kind == 2:
+                item.update_special_pos(self.f_size, kind)
+                rerouted.append(item)
             # プレイヤーが障害物に，敵が壁に衝突した場合
-            elif collided_wall and kind == 2 or collided_block and kind == 1:
+            elif collided_wall or collided_block:
                 item.update_pos(stuck=True)
             # どれにも当てはまらない場合，位置を更新
             else:
                 item.update_pos()
+
+        # 移動先を変えたアイテムは，変えた先も壁か障害物ならその場に留まる
+        targets = [(item.next_x, item.next_y) for item in rerouted]
+        wall_hits = self.obstacles.hits("wall", targets)
+        block_hits = self.obstacles.hits("block", targets)
+        for item, collided_wall, collided_block in zip(
+                rerouted, wall_hits, block_hits):
+            item.update_pos(stuck=collided_wall or collided_block)
         return None
 
     if __name__ == "__main__":
@@ -5,15 +5,29 @@ from block import Block
 from enemy import Enemy
 from food import Food
 from field import Field
+from cell_pool import FreeCellPool, bernoulli_indices
+from chase import DistanceField
+from scheduler import TickScheduler
+from instrument import PhaseTimer, NullTimer
 from input_without_enter import InputWithoutEnter as Input
 from config import Parameters
-from random import randint as random
+from headless import GameResult, Policy, make_policy
+from replay import ReplayRecorder
+from events import EventWriter, NullEventWriter
+import random
 import logging
-import os
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from snapshot import Snapshot
 
 
 logger = logging.getLogger(__name__)
 
+# 1ティックの結果
+CONTINUE = "Continue"
+GAME_OVER = "Game Over!"
+NEXT_STAGE = "Next stage"
+
 
 class Game():
     """ゲームの進行をするクラス
@@ -22,24 +36,130 @@ class Game():
     Attributes:
         players (list[Player]): プレイヤーのリスト
         field (Field): フィールドのインスタンス
+        clear_count (int): ステージクリア数
+        headless (bool): ヘッドレス実行かどうか
+        enemy_engine (EnemyEngine | None): NumPyによる敵の一括移動エンジン
+        distances (DistanceField | None): 敵が追いかけるときの，プレイヤーまでの距離マップ
+        result (GameResult | None): ヘッドレス実行の結果
+        seed (int): 乱数のシード
+        rng (random.Random): ゲームの乱数生成器．ゲーム内の乱数は全てここから引く
+        recorder (ReplayRecorder | None): リプレイの記録
+        timer (PhaseTimer | NullTimer): ゲームループの処理ごとの計測
+        events (EventWriter | NullEventWriter): 移動，衝突，食べ物の取得などのイベントの記録
+        tick (int): ゲーム開始からのティック数
+        params (Parameters): ゲームを作ったときのパラメータ
+        snapshot_path (str | None): 終了時のスナップショットの書き出し先
     """
 
-    def __init__(self, params: Parameters) -> None:
+    def __init__(
+            self,
+            params: Parameters,
+            policy: Policy | None = None,
+            replay_path: str | None = None,
+            autostart: bool = True,
+            events_path: str | None = None,
+            snapshot: "Snapshot | None" = None,
+            snapshot_path: str | None = None) -> None:
 
         """Gameクラスの初期化をする関数
+        `params.headless`がTrueの場合は描画とキー入力なしで実行し，
+        結果を`result`に保存する．
 
         Args:
            params (Parameters): configのパラメータのインスタンス
+           policy (Policy | None): ヘッドレス実行時の入力方針，
+               Noneならパラメータから作る
+           replay_path (str | None): リプレイの書き出し先，Noneなら記録しない
+           autostart (bool): Trueならそのままゲームを実行する．
+               Falseなら初期設定だけ行い，`step`や`run`で進める
+           events_path (str | None): イベントの書き出し先(JSONL)，Noneなら記録しない
+           snapshot (Snapshot | None): 再開するスナップショット，Noneなら新しいゲームを始める
+           snapshot_path (str | None): 終了時のスナップショットの書き出し先，Noneなら保存しない
         """
+        self.params = params
         self.players: list[Player] = []
         self.walls: list[Wall] = []
         self.blocks: list[Block] = []
         self.enemies: list[Enemy] = []
         self.foods: list[Food] = []
         self.field = Field([], [], [], [], [], 0)
+        self.enemy_engine = None  # NumPyによる敵の一括移動エンジン
+        self.distances = None  # プレイヤーまでの距離マップ
+        # 差分描画(viewportならプレイヤーの周りのターミナルに収まる範囲だけを描く)
+        # ヘッドレス実行では描画しないため，描画のモジュールも読み込まない
+        self.renderer = None
+        if not params.headless:
+            from renderer import TerminalRenderer, ViewportRenderer
+            self.renderer = (
+                ViewportRenderer() if params.viewport else TerminalRenderer())
         self.clear_count = 0    # ステージクリア数
-        self.setup(params)  # ゲームの初期設定
-        self.start(params)  # ゲームのメインループ
+        self.headless = params.headless  # ヘッドレス実行かどうか
+        self.result: GameResult | None = None  # ヘッドレス実行の結果
+        # ゲームループの処理ごとの計測(計測しない場合は何もしないタイマー)
+        self.timer = PhaseTimer() if params.instrument else NullTimer()
+        # シードが負なら新しく決め，同じシードなら同じゲームを再現できるようにする
+        self.seed = params.seed
+        if self.seed < 0:
+            self.seed = random.SystemRandom().randrange(2 ** 32)
+        self.rng = random.Random(self.seed)
+        logger.info(f"seed: {self.seed}")
+        self.recorder: ReplayRecorder | None = None
+        if replay_path is not None:
+            self.recorder = ReplayRecorder(
+                open(replay_path, "wb"), params, self.seed, params.player_num)
+        # イベントはまとめて書き出すため，ティックごとにはファイルへ書き込まない
+        self.tick = 0
+        self.events = NullEventWriter()
+        if events_path is not None:
+            self.events = EventWriter(events_path)
+        self.snapshot_path = snapshot_path
+        if snapshot is not None:
+            snapshot.apply(self, params)  # 保存したところから再開する
+        else:
+            self.setup(params)  # ゲームの初期設定
+        if autostart:
+            self.run(params, policy)
+
+    def run(self, params: Parameters, policy: Policy | None = None) -> None:
+        """ゲームの実行
+        ヘッドレス実行ならその結果を`result`に保存し，そうでなければメインループを実行する．
+        終了時にリプレイの記録を閉じる．
+
+        Args:
+           params (Parameters): configのパラメータのインスタンス
+           policy (Policy | None): ヘッドレス実行時の入力方針，
+               Noneならパラメータから作る
+        """
+        try:
+            if self.headless:
+                self.result = self.run_headless(
+                    params, policy or make_policy(params, self.seed))
+            else:
+                self.start(params)  # ゲームのメインループ
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """終了時のスナップショットを保存し，リプレイとイベントの記録を閉じる"""
+        if self.snapshot_path is not None:
+            from snapshot import save
+            save(self, self.snapshot_path)
+            self.snapshot_path = None
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        self.events.close()
+
+    def next_stage(self, params: Parameters) -> None:
+        """次のステージへ進む
+        ステージクリア数を1つ増やし，新しいステージを生成するメソッド．
+        ステージをクリアした(`step`がNEXT_STAGEを返した)ときに呼ぶ．
+
+        Args:
+           params (Parameters): configのパラメータのインスタンス
+        """
+        self.clear_count = self.clear_count + 1
+        self.setup(params)
 
     def setup(self, params: Parameters) -> None:
         """Gameの初期設定
@@ -51,56 +171,169 @@ class Game():
         f_size = params.field_size  # フィールドのサイズ
         e_num = params.enemy_num + (self.clear_count % 30)  # 敵の数
         f_num = params.food_num  # 食べ物の数
-        item_space = []  # アイテムがある場所
+        if f_size < 4:
+            raise ValueError("field_size must be greater than 4")
+        # 壁の内側の空きマス．取り出したマスは二度と出ないので，アイテムは重ならない
+        free_cells = FreeCellPool(1, 1, f_size - 2, f_size - 2, self.rng)
         # フィールドの初期化
         self.players = [
-            Player(random(1, f_size - 2), random(1, f_size - 2))
-            for _ in range(1)]
+            Player(*free_cells.sample()) for _ in range(params.player_num)]
         # 敵をフィールド内に生成する
-        self.enemies = [
-            Enemy(random(1, f_size - 2), random(1, f_size - 2))
-            for _ in range(e_num)]
+        self.enemies = [Enemy(*free_cells.sample()) for _ in range(e_num)]
         # 食べ物をフィールド内に生成する
-        self.foods = [
-            Food(random(1, f_size - 2), random(1, f_size - 2))
-            for _ in range(f_num)]
-        # フィールドの周りを壁とするwallインスタンスを生成
-        if f_size < 4:
-            raise ValueError("field_size must be greater than 4")
-        self.walls = [
-            Wall(x, y)
-            for x in range(f_size)
-            for y in range(f_size)
-            if x == 0 or x == f_size - 1 or y == 0 or y == f_size - 1
-        ]
+        self.foods = [Food(*free_cells.sample()) for _ in range(f_num)]
+        # フィールドの周りの壁はFieldが外周として扱うため，Wallは内側の壁だけを持つ
+        self.walls = []
         # 障害物をフィールド内に生成する
-        self.blocks = [
-            Block(x, y)
-            for x in range(1, f_size - 2)
-            for y in range(1, f_size - 2)
-            if x == random(1, f_size - 2) or y == random(1, f_size - 2)
-        ]
-        # アイテムの位置が重複している場合，新たな座標を付与
-        for item in self.players + self.enemies + self.foods + self.blocks:
-            if item.now_x * item.now_y not in item_space:
-                item_space.append(item.now_x * item.now_y)
+        # 各マスは，x座標かy座標が1からf_size - 2の乱数と一致する確率で選ばれる．
+        # 選ばれるマスだけを幾何分布で飛ばしながら引くため，障害物の数に比例する時間で済む
+        # 選んだマスが既に埋まっている場合は，空いているマスに置く
+        self.blocks = []
+        side = max(f_size - 3, 0)  # 障害物の候補になる範囲の1辺
+        p = 1 - (1 - 1 / (f_size - 2)) ** 2
+        for i in bernoulli_indices(side * side, p, self.rng):
+            x, y = 1 + i // side, 1 + i % side
+            if free_cells.take(x, y):
+                self.blocks.append(Block(x, y))
             else:
-                while True:
-                    item.now_x = random(1, f_size - 2)
-                    item.now_y = random(1, f_size - 2)
-                    if item.now_x * item.now_y not in item_space:
-                        item_space.append(item.now_x * item.now_y)
-                        item.next_x = item.now_x
-                        item.next_y = item.now_y
-                        break
+                self.blocks.append(Block(*free_cells.sample()))
+
+        self.build_stage(params)
+        self.events.emit(
+            self.tick, "stage", stage=self.clear_count, seed=self.seed,
+            enemies=e_num, blocks=len(self.blocks))
+
+    def build_stage(self, params: Parameters) -> None:
+        """ステージの構築
+        配置が決まったアイテムから，フィールド，距離マップ，敵の一括移動エンジンを作るメソッド．
+        `setup`と，スナップショットからの再開で使う．
 
+        Args:
+           params (Parameters): configのパラメータのインスタンス
+        """
         self.field = Field(
             self.players,
             self.walls,
             self.blocks,
             self.enemies,
             self.foods,
-            f_size)
+            params.field_size,
+            boundary=True)
+
+        # 敵がプレイヤーを追いかける場合は，全ての敵で共有する距離マップを作る
+        self.distances = None
+        if params.enemy_policy == "chase":
+            self.distances = DistanceField(self.field)
+
+        # NumPyで敵をまとめて動かすエンジン(NumPyは任意の依存のため必要なときだけ読み込む)
+        self.enemy_engine = None
+        if params.enemy_engine == "numpy":
+            import numpy as np
+            from enemy_engine import EnemyEngine
+            self.enemy_engine = EnemyEngine(
+                self.enemies, self.walls, self.blocks, params.field_size,
+                np.random.default_rng(self.rng.getrandbits(64)),
+                self.distances,
+                boundary=True)
+
+    def step(self, keys: list[str]) -> str:
+        """1ティック分ゲームを進める
+        プレイヤーと敵の移動，衝突判定，フィールド更新を行うメソッド
+
+        Args:
+            keys (list[str]): プレイヤーごとに押されたキー
+
+        Returns:
+            str: ティックの結果 (CONTINUE, GAME_OVER, NEXT_STAGE のいずれか)
+        """
+        # リプレイにキー入力を記録
+        if self.recorder is not None:
+            self.recorder.record(keys)
+
+        # プレイヤーの移動を決定(敵に当たったプレイヤーはもう動かない)
+        alive = [player for player in self.players if player.status]
+        for player, key in zip(self.players, keys):
+            if player.status:
+                player.get_next_pos(Input.key_to_direction(key))
+        self.timer.lap("player")
+
+        # 距離マップはプレイヤーが動いたときだけ計算し直す
+        if self.distances is not None:
+            self.distances.update([(p.now_x, p.now_y) for p in alive])
+            self.timer.lap("distance_field")
+
+        # 敵の移動を決定(NumPyのエンジンは移動までまとめて行う)
+        if self.enemy_engine is not None:
+            self.enemy_engine.step()
+            # 描画するときだけ敵のインスタンスに座標を書き戻す
+            if not self.headless:
+                self.enemy_engine.sync(self.enemies)
+        elif self.distances is not None:
+            for enemy in self.enemies:
+                enemy.get_chase_pos(self.distances, self.rng)
+        else:
+            for enemy in self.enemies:
+                enemy.get_next_pos(self.rng)
+        self.timer.lap("enemy")
+
+        # プレイヤーと敵の移動
+        before = [(player.now_x, player.now_y) for player in self.players]
+        self.field.post_collision_processing(alive, 1)
+        if self.enemy_engine is None:
+            self.field.post_collision_processing(self.enemies, 2)
+        self.timer.lap("post_collision_processing")
+
+        outcome = CONTINUE
+        for i, player in enumerate(self.players):
+            if not player.status:
+                continue
+            pos = [player.now_x, player.now_y]
+            if before[i] != (player.now_x, player.now_y):
+                self.events.emit(
+                    self.tick, "move", player=i, key=keys[i], pos=pos)
+
+            # 敵との衝突判定
+            if self._hit_enemy(player):
+                player.change_face_bad()
+                self.events.emit(self.tick, "collision", player=i, pos=pos)
+                # 他に残っているプレイヤーがいれば，このプレイヤーだけがフィールドから消える
+                if any(p.status for p in self.players if p is not player):
+                    player.status = False
+                    continue
+                outcome = GAME_OVER
+                break
+
+            # 食べ物との衝突判定(占有インデックスには食べた後の食べ物も残っている)
+            collided_item = self.field.collision(player, self.foods)
+            if collided_item is not None and collided_item.status:
+                collided_item.status = False
+                self.events.emit(self.tick, "pickup", player=i, pos=pos)
+                if all([not food.status for food in self.foods]):
+                    player.change_face_good()
+                    outcome = NEXT_STAGE
+                    break
+        self.timer.lap("collision")
+
+        # filedの更新(ヘッドレス実行では描画しないため，型付きのマス目だけを更新する)
+        if not self.headless:
+            self.field.update_field()
+        elif self.enemy_engine is not None:
+            # 敵のインスタンスに書き戻していないため，エンジンの座標を渡す
+            # (NumPyの要素を1つずつ取り出すと遅いため，先にリストにする)
+            engine = self.enemy_engine
+            self.field.update_ids(
+                zip(engine.xs.tolist(), engine.ys.tolist()))
+        else:
+            self.field.update_ids()
+        self.timer.lap("update_field")
+        self.tick = self.tick + 1
+        return outcome
+
+    def _hit_enemy(self, player: Player) -> bool:
+        """プレイヤーが敵と同じマスにいるかを判定する"""
+        if self.enemy_engine is not None:
+            return self.enemy_engine.occupied(player.next_x, player.next_y)
+        return self.field.collision(player, self.enemies) is not None
 
     def start(self, params: Parameters) -> str:
         """ゲームのメインループ
@@ -108,70 +341,77 @@ class Game():
         キー入力を受け取る、プレイヤーと敵の移動、フィールド更新
         アイテムを取るとステージクリアで敵が1増え、次のステージへ
         敵と接触するとゲームオーバー、スコア表示（ゲーム終了条件）
+        ステージが進んでも再帰せず同じループで続けるため，
+        何ステージ目でも使うスタックとメモリは変わらない
 
         Returns:
-            str: ゲームの終了時のメッセージ (例: "Game Over!", "Game Clear!")
+            str: ゲームの終了時のメッセージ (例: "Game Over!")
         """
         # ゲームのメインループ
-        while True:
-            #  フィールドの表示
-            os.system("cls" if os.name == "nt" else "clear")  # ターミナルのクリア
-            self.field.display_field()
-
-            # プレイヤーの移動を決定
-            for player in self.players:
-                # キー入力を受け取る
-                key = Input.get_user_input()
-                player.get_next_pos(key)
-
-            # 敵の移動を決定
-            for enemy in self.enemies:
-                enemy.get_next_pos()
-
-            # プレイヤーと敵の移動
-            self.field.post_collision_processing(list(self.players), 1)
-            self.field.post_collision_processing(list(self.enemies), 2)
-
-            for player in self.players:
-                # 敵との衝突判定
-                if self.field.collision(player, list(self.enemies)):
-                    player.change_face_bad()
-                    self.field.update_field()
-                    os.system("cls" if os.name == "nt" else "clear")
-                    # ターミナルをクリア
-                    self.field.display_field()
+        # 端末の設定はゲームの間1回だけ行い，キー入力を待たずに一定間隔でティックを進める
+        with Input.key_reader() as reader:
+            scheduler = TickScheduler(params.tick_interval)
+            self.timer.start()
+            while True:
+                #  フィールドの表示(変化したマスだけを描き直す)
+                self.renderer.render(self.field)
+                self.timer.lap("render")
+
+                # 届いているキー入力を受け取り，1ティック進める
+                keys = [reader.poll() for _ in self.players]
+                self.timer.lap("input")
+                outcome = self.step(keys)
+
+                if outcome == GAME_OVER:
+                    self.renderer.render(self.field)
                     logger.info("Game Over!")
                     print("Clear Stage:", self.clear_count)
                     return "Game Over!"
 
-                # 食べ物との衝突判定
-                collided_item = self.field.collision(player, list(self.foods))
-                if collided_item is not None:
-                    collided_item.status = False
-                    if all([not food.status for food in self.foods]):
-                        player.change_face_good()
-                        self.field.update_field()
-                        os.system("cls" if os.name == "nt" else "clear")
-                        # ターミナルをクリア
-                        self.field.display_field()
-                        logger.info("Next stage")
-                        # 新しいステージの生成
-                        self.clear_count = self.clear_count + 1
-                        self.setup(params)
-                        self.next_game(params)
-                        return "Next stage"
-
-            # filedの更新
-            self.field.update_field()
+                if outcome == NEXT_STAGE:
+                    self.renderer.render(self.field)
+                    logger.info("Next stage")
+                    # 新しいステージを生成し，同じループのまま次のステージを始める
+                    self.next_stage(params)
+                    continue
 
-            # 一定の間隔で処理を繰り返す
-            # 0.3秒待つ
-            time.sleep(0.3)
+                # 処理にかかった時間を差し引いて，一定の間隔で処理を繰り返す
+                scheduler.wait()
+                self.timer.lap("wait")
 
-            # 終了時のチェック
+    def run_headless(self, params: Parameters, policy: Policy) -> GameResult:
+        """ヘッドレス実行のメインループ
+        描画，キー入力の待ち，スリープをせずにゲームを進めるメソッド．
+        入力は入力方針から受け取る．
 
-    def next_game(self, params) -> None:
-        """次のゲームの開始
-            次のゲームを開始する
+        Args:
+            params (Parameters): configのパラメータのインスタンス
+            policy (Policy): 入力方針
+
+        Returns:
+            GameResult: クリアしたステージ数，ティック数，終了理由
         """
-        self.start(params)
+        begin = time.perf_counter()
+        ticks = 0
+        cause = "max_ticks"
+        self.timer.start()
+        while params.max_ticks <= 0 or ticks < params.max_ticks:
+            keys = [policy(self) for _ in self.players]
+            self.timer.lap("input")
+            if None in keys:
+                cause = "input_end"
+                break
+            outcome = self.step(keys)
+            ticks = ticks + 1
+            if outcome == GAME_OVER:
+                cause = "enemy"
+                break
+            if outcome == NEXT_STAGE:
+                self.next_stage(params)
+        result = GameResult(
+            stages_cleared=self.clear_count,
+            ticks=ticks,
+            cause=cause,
+            elapsed=time.perf_counter() - begin)
+        logger.info(result)
+        return result
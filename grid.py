@@ -0,0 +1,214 @@
+"""疎なマス目
+何も置かれていないマスを持たずに，アイコンのあるマスだけを行ごとの辞書で保持するモジュール．
+メモリはアイテムのあるマスの数に比例するため，非常に大きなフィールドでも使える．
+"""
+import unicodedata
+from functools import lru_cache
+from typing import Iterator
+
+
+BLANK = "　"  # 何もないマスのアイコン
+
+
+@lru_cache(maxsize=None)
+def display_width(text: str) -> int:
+    """
+    文字列をターミナルに表示したときの幅を返す関数
+    全角の文字と絵文字は2，結合文字や異体字セレクタなどの幅のない文字は0とする．
+    アイコンは種類が少ないため，結果を記録して使い回す．
+
+    Args:
+        text (str): 文字列
+
+    Returns:
+        int: 表示幅
+
+    Examples:
+        >>> display_width("👻"), display_width("🗻"), display_width(BLANK)
+        (2, 2, 2)
+        >>> display_width("p1"), display_width("⚪\ufe0f")
+        (2, 2)
+    """
+    width = 0
+    for ch in text:
+        if unicodedata.category(ch) in ("Mn", "Me", "Cf"):
+            continue
+        width += 2 if unicodedata.east_asian_width(ch) in ("W", "F") else 1
+    return width
+
+
+class SparseGrid:
+    """疎なマス目
+    `grid[y][x]`で読み出せるが，`grid[y]`はその行を並べた新しいリストを返すため，
+    書き込みは`set`で行う．
+    `border`を指定すると，外周のマスは何も置かれていなければそのアイコンになる．
+    外周の行と列はあらかじめ作った行から写すため，外周のマスは辞書に持たない．
+
+    Attributes:
+        size (int): マス目の1辺の長さ
+        border (str | None): 外周のマスのアイコン，Noneなら外周も何もないマス
+        rows (dict[int, dict[int, str]]): y座標 -> (x座標 -> アイコン)
+
+    Examples:
+        >>> grid = SparseGrid(3)
+        >>> grid.set(1, 0, "p1")
+        >>> grid[0]
+        ['　', 'p1', '　']
+        >>> grid.get(1, 0), len(grid), grid.count()
+        ('p1', 3, 1)
+        >>> grid.set(1, 0, BLANK)
+        >>> grid.rows
+        {}
+        >>> grid = SparseGrid(4, border="w")
+        >>> grid.set(1, 1, "p1")
+        >>> grid[0], grid[1]
+        (['w', 'w', 'w', 'w'], ['w', 'p1', '　', 'w'])
+        >>> grid.set(0, 0, "w")  # 外周と同じアイコンは持たない
+        >>> grid.count()
+        1
+    """
+
+    def __init__(self, size: int, border: str | None = None) -> None:
+        """
+        SparseGridクラスの初期化をする関数
+
+        Args:
+            size (int): マス目の1辺の長さ
+            border (str | None): 外周のマスのアイコン，Noneなら外周も何もないマス
+        """
+        self.size = size
+        self.border = border
+        self.rows: dict[int, dict[int, str]] = {}
+        # 何も置かれていない場合の，外周の行とそれ以外の行
+        if border is None or size <= 0:
+            self._edge_row = self._inner_row = [BLANK] * size
+        else:
+            self._edge_row = [border] * size
+            self._inner_row = [border] + [BLANK] * (size - 2) + [border]
+            self._inner_row = self._inner_row[:size]
+
+    def background(self, x: int, y: int) -> str:
+        """
+        何も置かれていない場合のマスのアイコンを返すメソッド
+
+        Args:
+            x (int): x座標
+            y (int): y座標
+
+        Returns:
+            str: 外周ならborder，それ以外ならBLANK
+        """
+        if self.border is not None and (
+                x == 0 or y == 0 or x == self.size - 1 or y == self.size - 1) \
+                and 0 <= x < self.size and 0 <= y < self.size:
+            return self.border
+        return BLANK
+
+    def get(self, x: int, y: int) -> str:
+        """
+        マスのアイコンを返すメソッド
+
+        Args:
+            x (int): x座標
+            y (int): y座標
+
+        Returns:
+            str: アイコン．何も置かれていなければ`background`
+        """
+        row = self.rows.get(y)
+        if row is not None:
+            icon = row.get(x)
+            if icon is not None:
+                return icon
+        return self.background(x, y)
+
+    def set(self, x: int, y: int, icon: str) -> None:
+        """
+        マスのアイコンを書き換えるメソッド．`background`と同じアイコンを書くとマスを削除する
+
+        Args:
+            x (int): x座標
+            y (int): y座標
+            icon (str): アイコン
+        """
+        if icon == self.background(x, y):
+            row = self.rows.get(y)
+            if row is not None:
+                row.pop(x, None)
+                if not row:
+                    del self.rows[y]
+        else:
+            self.rows.setdefault(y, {})[x] = icon
+
+    def clear(self) -> None:
+        """全てのマスを何も置かれていない状態にするメソッド"""
+        self.rows.clear()
+
+    def count(self) -> int:
+        """
+        アイコンを持っているマスの数を返すメソッド
+
+        Returns:
+            int: アイコンを持っているマスの数
+        """
+        return sum(len(row) for row in self.rows.values())
+
+    def window(self, x0: int, y0: int, width: int, height: int) -> list[str]:
+        """
+        長方形の範囲を1行ずつの文字列にして返すメソッド
+        範囲の外側のマスはBLANKとする．
+
+        Args:
+            x0 (int): 範囲の左端のx座標
+            y0 (int): 範囲の上端のy座標
+            width (int): 範囲の幅
+            height (int): 範囲の高さ
+
+        Returns:
+            list[str]: 範囲の各行の文字列
+
+        Examples:
+            >>> grid = SparseGrid(100)
+            >>> grid.set(50, 50, "p1")
+            >>> grid.window(49, 49, 3, 2)
+            ['　　　', '　p1　']
+            >>> SparseGrid(4, border="w").window(-1, 2, 3, 2)
+            ['　w　', '　ww']
+        """
+        lines = []
+        for y in range(y0, y0 + height):
+            if 0 <= x0 and x0 + width <= self.size and 0 <= y < self.size:
+                # あらかじめ作った行を切り出し，置かれているマスだけを上書きする
+                cells = (self._edge_row if y in (0, self.size - 1)
+                         else self._inner_row)[x0:x0 + width]
+                for x, icon in self.rows.get(y, {}).items():
+                    if x0 <= x < x0 + width:
+                        cells[x - x0] = icon
+                lines.append("".join(cells))
+            else:
+                lines.append("".join(
+                    self.get(x, y) for x in range(x0, x0 + width)))
+        return lines
+
+    def __getitem__(self, y: int) -> list[str]:
+        """y行目のマスを並べたリストを返す"""
+        cells = list(
+            self._edge_row if y in (0, self.size - 1) else self._inner_row)
+        for x, icon in self.rows.get(y, {}).items():
+            if 0 <= x < self.size:
+                cells[x] = icon
+        return cells
+
+    def __len__(self) -> int:
+        """行の数を返す"""
+        return self.size
+
+    def __iter__(self) -> Iterator[list[str]]:
+        """全ての行を上から順に返す"""
+        for y in range(self.size):
+            yield self[y]
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
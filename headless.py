@@ -0,0 +1,114 @@
+"""ヘッドレス実行
+画面描画とキー入力を使わずにゲームを最高速で進めるための入力方針と結果の型
+"""
+from __future__ import annotations
+import random
+from dataclasses import dataclass
+from typing import Callable
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from config import Parameters
+    from game import Game
+
+
+# 入力方針: ゲームを受け取り，押すキーを返す．Noneを返すと入力の終わりとみなす
+Policy = Callable[["Game"], "str | None"]
+
+
+@dataclass(frozen=True)
+class GameResult:
+    """
+    ヘッドレス実行の結果を保持するクラス
+
+    Attributes:
+        stages_cleared (int): クリアしたステージ数
+        ticks (int): 進めたティック数
+        cause (str): 終了理由("enemy": 敵と衝突，"max_ticks": ティック数の上限，
+            "input_end": 入力の終わり)
+        elapsed (float): 実行にかかった秒数
+    """
+    stages_cleared: int
+    ticks: int
+    cause: str
+    elapsed: float
+
+    @property
+    def ticks_per_sec(self) -> float:
+        """
+        1秒あたりのティック数
+
+        Examples:
+            >>> GameResult(0, 100, "enemy", 0.5).ticks_per_sec
+            200.0
+        """
+        if self.elapsed <= 0:
+            return 0.0
+        return self.ticks / self.elapsed
+
+
+def file_policy(path: str) -> Policy:
+    """
+    ファイルに書かれたキーを1ティックに1文字ずつ返す入力方針を作る関数
+    改行は読み飛ばす．
+
+    Args:
+        path (str): 入力ファイルのパス
+
+    Returns:
+        Policy: 入力方針
+
+    Examples:
+        >>> import tempfile
+        >>> with tempfile.NamedTemporaryFile("w", delete=False) as f:
+        ...     _ = f.write("wd\\ns")
+        >>> policy = file_policy(f.name)
+        >>> [policy(None) for _ in range(4)]
+        ['w', 'd', 's', None]
+    """
+    with open(path) as f:
+        keys = iter(f.read().replace("\n", ""))
+    return lambda game: next(keys, None)
+
+
+def random_policy(rng: random.Random | None = None) -> Policy:
+    """
+    上下左右と停止からランダムにキーを選ぶ入力方針を作る関数
+
+    Args:
+        rng (random.Random | None): 乱数生成器，Noneならrandomモジュール
+
+    Returns:
+        Policy: 入力方針
+
+    Examples:
+        >>> policy = random_policy(random.Random(0))
+        >>> policy(None) in ("w", "a", "s", "d", "")
+        True
+    """
+    choice = (rng or random).choice
+    keys = ("w", "a", "s", "d", "")
+    return lambda game: choice(keys)
+
+
+def make_policy(params: Parameters, seed: int | None = None) -> Policy:
+    """
+    パラメータから入力方針を作る関数
+    `input_file`が指定されていればファイルから，なければランダムに入力する．
+
+    Args:
+        params (Parameters): configのパラメータのインスタンス
+        seed (int | None): ランダムな入力のシード．ゲームの乱数とは別の系列を使う
+
+    Returns:
+        Policy: 入力方針
+    """
+    if params.input_file:
+        return file_policy(params.input_file)
+    if seed is None:
+        return random_policy()
+    return random_policy(random.Random(f"policy-{seed}"))
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -1,5 +1,9 @@
+import os
 import sys
+import select
 import termios
+from collections import deque
+from typing import TextIO
 
 
 class InputWithoutEnter:
@@ -13,6 +17,22 @@ class InputWithoutEnter:
         """
         # キー入力
         key = InputWithoutEnter.input_without_enter()
+        return InputWithoutEnter.key_to_direction(key)
+
+    @staticmethod
+    def key_to_direction(key: str) -> tuple[int, int]:
+        """キーに対応するx, y座標の差分を返す
+        Args:
+           key (str): 入力されたキー
+        Returns:
+           tuple[int, int]:x, y座標の差分（例:（1, 0）、(-1, 0)、(0, 1)、(0, -1)など）
+
+        Examples:
+            >>> InputWithoutEnter.key_to_direction("w")
+            (0, -1)
+            >>> InputWithoutEnter.key_to_direction("x")
+            (0, 0)
+        """
         # 入力されたキーに対応する座標差分を返す
         if key == "w":
             return (0, -1)
@@ -25,6 +45,14 @@ class InputWithoutEnter:
         else:
             return (0, 0)
 
+    @staticmethod
+    def key_reader() -> "KeyReader":
+        """キー入力をブロックせずに受け取る`KeyReader`を返す
+        Returns:
+           KeyReader: 標準入力から読み込む`KeyReader`
+        """
+        return KeyReader()
+
     @staticmethod
     def input_without_enter():
         '''エンターキーを押さずに入力を受け取る
@@ -61,3 +89,74 @@ class InputWithoutEnter:
             termios.tcsetattr(fd, termios.TCSANOW, old)
 
         return ch
+
+
+class KeyReader:
+    """ユーザの入力をブロックせずに受け取るクラス
+    `with`で使う間だけ端末をカノニカルモードとエコーなしにし(設定は1回だけ)，
+    届いているキーを待たずに読み込んでバッファに溜める．
+    キーが押されていなくてもゲームは止まらずに進む．
+
+    Attributes:
+        stream (TextIO): 入力元
+        buffer (deque[str]): 読み込んだがまだ使っていないキー
+
+    Examples:
+        >>> r, w = os.pipe()
+        >>> reader = KeyReader(os.fdopen(r))
+        >>> with reader:
+        ...     reader.poll()
+        ...     _ = os.write(w, b"wd")
+        ...     reader.poll(), reader.poll(), reader.poll()
+        ''
+        ('w', 'd', '')
+        >>> os.close(w)
+    """
+
+    def __init__(self, stream: TextIO | None = None, maxlen: int = 4) -> None:
+        """
+        KeyReaderクラスの初期化をする関数
+
+        Args:
+            stream (TextIO | None): 入力元，Noneなら標準入力
+            maxlen (int): 溜めておくキーの最大数．溢れたら古いキーから捨てる
+        """
+        self.stream = stream if stream is not None else sys.stdin
+        self.buffer: deque[str] = deque(maxlen=maxlen)
+        self._old = None  # 元の端末属性
+
+    def __enter__(self) -> "KeyReader":
+        """端末をカノニカルモードとエコーなしにする(端末でなければ何もしない)"""
+        fd = self.stream.fileno()
+        if os.isatty(fd):
+            self._old = termios.tcgetattr(fd)
+            new = termios.tcgetattr(fd)
+            # ICANON(カノニカルモードのフラグ)とECHO(エコーのフラグ)を外す
+            new[3] &= ~(termios.ICANON | termios.ECHO)
+            termios.tcsetattr(fd, termios.TCSANOW, new)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        """端末の属性を元に戻す"""
+        if self._old is not None:
+            termios.tcsetattr(
+                self.stream.fileno(), termios.TCSANOW, self._old)
+            self._old = None
+
+    def poll(self) -> str:
+        """
+        届いているキーを全て読み込み，溜めたキーを古い順に1つ返すメソッド
+        キーがなければ待たずに空文字を返す．
+
+        Returns:
+            str: 入力された文字，なければ空文字
+        """
+        fd = self.stream.fileno()
+        while select.select([fd], [], [], 0)[0]:
+            data = os.read(fd, 1024)
+            if not data:
+                break
+            self.buffer.extend(data.decode(errors="ignore"))
+        if self.buffer:
+            return self.buffer.popleft()
+        return ""
@@ -0,0 +1,200 @@
+"""ゲームループの計測
+ゲームループの処理ごとの時間を，ヒストグラムに記録するモジュール．
+ヒストグラムは2のべき乗ごとに4分割した固定のビンに数を足すだけなので，記録の負荷が小さい．
+"""
+import json
+import time
+
+
+# 2のべき乗の区間をいくつに分割するか(2 ** SUB_BITS)
+SUB_BITS = 2
+
+
+class LatencyHistogram:
+    """時間のヒストグラム
+    ナノ秒の値を対数スケールのビンに数える．パーセンタイルはビンの上限で近似する
+    (相対誤差は最大で 1 / 2 ** SUB_BITS)．
+
+    Attributes:
+        counts (list[int]): ビンごとの数
+        count (int): 記録した数
+        total (int): 記録した値の合計(ナノ秒)
+        max (int): 記録した値の最大値(ナノ秒)
+
+    Examples:
+        >>> h = LatencyHistogram()
+        >>> for ns in range(1, 101):
+        ...     h.record(ns * 1000)
+        >>> h.count, h.max
+        (100, 100000)
+        >>> 50000 <= h.percentile(50) <= 50000 * 1.25
+        True
+        >>> h.percentile(100) >= 100000
+        True
+    """
+
+    def __init__(self) -> None:
+        """LatencyHistogramクラスの初期化をする関数"""
+        self.counts = [0] * (64 << SUB_BITS)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns: int) -> None:
+        """
+        値を1つ記録するメソッド
+
+        Args:
+            ns (int): 記録する時間(ナノ秒)
+        """
+        self.counts[_bucket(ns)] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, p: float) -> int:
+        """
+        パーセンタイルを返すメソッド
+
+        Args:
+            p (float): パーセント(0から100)
+
+        Returns:
+            int: パーセンタイルの近似値(ナノ秒)．記録がなければ0
+        """
+        if self.count == 0:
+            return 0
+        rank = max(1, -(-self.count * p // 100))  # 切り上げ
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(_upper_bound(index), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        """
+        記録の要約をマイクロ秒で返すメソッド
+
+        Returns:
+            dict: 数，合計，平均，50/90/99パーセンタイル，最大値
+        """
+        return {
+            "count": self.count,
+            "total_ms": self.total / 1e6,
+            "mean_us": self.total / self.count / 1e3 if self.count else 0.0,
+            "p50_us": self.percentile(50) / 1e3,
+            "p90_us": self.percentile(90) / 1e3,
+            "p99_us": self.percentile(99) / 1e3,
+            "max_us": self.max / 1e3,
+        }
+
+
+class PhaseTimer:
+    """ゲームループの処理ごとの計測
+    `lap`を呼ぶたびに，前回の`lap`(または`start`)からの時間を処理の名前で記録する．
+
+    Attributes:
+        histograms (dict[str, LatencyHistogram]): 処理ごとのヒストグラム
+
+    Examples:
+        >>> timer = PhaseTimer()
+        >>> timer.start()
+        >>> timer.lap("enemy")
+        >>> timer.lap("render")
+        >>> sorted(timer.summary())
+        ['enemy', 'render']
+    """
+
+    def __init__(self) -> None:
+        """PhaseTimerクラスの初期化をする関数"""
+        self.histograms: dict[str, LatencyHistogram] = {}
+        self._last = time.perf_counter_ns()
+
+    def start(self) -> None:
+        """計測の起点を今にするメソッド"""
+        self._last = time.perf_counter_ns()
+
+    def lap(self, phase: str) -> None:
+        """
+        前回からの時間を処理の名前で記録するメソッド
+
+        Args:
+            phase (str): 処理の名前
+        """
+        now = time.perf_counter_ns()
+        histogram = self.histograms.get(phase)
+        if histogram is None:
+            histogram = self.histograms[phase] = LatencyHistogram()
+        histogram.record(now - self._last)
+        self._last = now
+
+    def summary(self) -> dict:
+        """
+        処理ごとの要約を返すメソッド
+
+        Returns:
+            dict: 処理の名前ごとの`LatencyHistogram.summary`
+        """
+        return {
+            phase: histogram.summary()
+            for phase, histogram in self.histograms.items()}
+
+    def dump(self, path: str) -> None:
+        """
+        処理ごとの要約をjsonファイルに書き出すメソッド
+
+        Args:
+            path (str): 書き出し先のパス
+        """
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=4)
+
+
+class NullTimer:
+    """計測しない場合に使う，何もしないPhaseTimer"""
+
+    def start(self) -> None:
+        """何もしない"""
+
+    def lap(self, phase: str) -> None:
+        """何もしない"""
+
+
+def _bucket(ns: int) -> int:
+    """
+    値が入るビンの番号を返す
+
+    Examples:
+        >>> [_bucket(ns) for ns in (0, 1, 3, 4, 5, 6, 7, 8)]
+        [0, 1, 3, 4, 5, 6, 7, 8]
+        >>> _bucket(1000) < _bucket(1300) < _bucket(2000)
+        True
+    """
+    if ns < (1 << SUB_BITS):
+        return max(ns, 0)
+    shift = ns.bit_length() - SUB_BITS - 1
+    return ((shift + 1) << SUB_BITS) + ((ns >> shift) & ((1 << SUB_BITS) - 1))
+
+
+def _upper_bound(index: int) -> int:
+    """
+    ビンに入る値の上限を返す
+
+    Examples:
+        >>> all(_bucket(_upper_bound(i)) == i for i in range(1, 200))
+        True
+        >>> all(_bucket(_upper_bound(i) + 1) == i + 1 for i in range(1, 200))
+        True
+    """
+    if index < (1 << SUB_BITS):
+        return index
+    shift = (index >> SUB_BITS) - 1
+    sub = index & ((1 << SUB_BITS) - 1)
+    return (((1 << SUB_BITS) + sub + 1) << shift) - 1
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
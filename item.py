@@ -13,8 +13,13 @@ class Item:
        next_y(int) : 次の時刻でのy座標
        status(bool) : アイテムの状態(True>存在,False>存在しない・消滅した)
        icon(str) : 表示されるアイテムのアイコン
+       occupancy(OccupancyIndex | None) : 登録されている占有インデックス
     """
 
+    # 大量に生成されるため，__dict__を持たせずメモリを節約する
+    __slots__ = (
+        "now_x", "now_y", "next_x", "next_y", "status", "icon", "occupancy")
+
     def __init__(self, x, y) -> None:
         """
         Itemクラスのコンストラクタ
@@ -48,6 +53,7 @@ class Item:
         self.next_y = y   # 次の時刻でのy座標
         self.status = True   # アイテムの状態(True>存在,False>存在しない・消滅した)
         self.icon = ""   # 表示されるアイテムのアイコン
+        self.occupancy = None   # 登録されている占有インデックス
 
     def get_next_pos(self) -> tuple[int, int]:
         """
@@ -106,6 +112,11 @@ class Item:
             self.next_x = self.now_x
             self.next_y = self.now_y
             return
+        # 占有インデックスに登録されていれば，登録位置も移動する
+        if self.occupancy is not None and (
+                self.next_x != self.now_x or self.next_y != self.now_y):
+            self.occupancy.move(
+                self, self.now_x, self.now_y, self.next_x, self.next_y)
         # 位置の更新
         self.now_x = self.next_x
         self.now_y = self.next_y
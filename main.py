@@ -1,10 +1,11 @@
 import os
+import json
 import argparse
+from dataclasses import asdict, replace
 from config import common_args, Parameters
 from utils import dump_params, setup_params
 from utils import set_logging
 import logging
-from game import Game
 
 
 def main() -> None:
@@ -12,11 +13,22 @@ def main() -> None:
     # コマンドライン引数の設定
     parser = argparse.ArgumentParser()
     parser = common_args(parser)  # コマンドライン引数引数を読み込み
-    # parser.add_argument("--main")
-    # # 実行スクリプト固有のコマンドライン引数があればここに記入する．
+    parser.add_argument(
+        "--restore",
+        help="保存したスナップショット(snapshot.bin)のところからゲームを再開する",
+        type=str,
+        default=None)
     args = parser.parse_args()
     params = Parameters(**setup_params(vars(args), args.parameters))
     # args，run_date，git_revisionなどを追加した辞書を取得
+    if args.headless:
+        params = replace(params, headless=True)
+    snapshot = None
+    if args.restore:
+        # ステージの設定はスナップショットに合わせる
+        from snapshot import load
+        snapshot = load(args.restore)
+        params = snapshot.parameters(params)
 
     # 結果出力用ファイルの作成
     result_dir = f'result/{params.run_date}'  # 結果出力ディレクトリ
@@ -36,7 +48,29 @@ def main() -> None:
     # do something...
     logger.info('Process terminated successfully. ')
 
-    Game(params)
+    # ゲームのモジュールは重いため，-hなどで終わる場合に読み込まないようここで読み込む
+    from game import Game
+    events_path = f'{result_dir}/events.jsonl' if params.events else None
+    # 再開したゲームはシードから再現できないため，リプレイは記録しない
+    replay_path = f'{result_dir}/replay.bin' if snapshot is None else None
+    game = Game(
+        params,
+        replay_path=replay_path,
+        autostart=False,
+        events_path=events_path,
+        snapshot=snapshot,
+        snapshot_path=f'{result_dir}/snapshot.bin')
+    if snapshot is not None:
+        snapshot.close()
+    game.run(params)  # 終了時の状態はsnapshot.binに保存される
+    if params.instrument:
+        # ゲームループの処理ごとの時間の要約を出力
+        game.timer.dump(f'{result_dir}/timings.json')
+    if game.result is not None:
+        # ヘッドレス実行の結果を出力
+        logger.info(f'ticks/sec: {game.result.ticks_per_sec:.1f}')
+        with open(f'{result_dir}/result.json', 'w') as f:
+            json.dump(asdict(game.result), f, indent=4)
 
 
 if __name__ == "__main__":
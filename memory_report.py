@@ -0,0 +1,166 @@
+"""メモリ使用量のレポート
+`__slots__`を持つアイテムと，`__dict__`を持つ従来のアイテムで
+障害物を生成したときのメモリ使用量を比較するスクリプト．
+外周の壁は`Field`が`Wall`なしで扱うため，ゲームが生成する動かないアイテムは障害物だけである．
+
+Usage:
+    python memory_report.py  # field_size 1000, 2000 で比較
+    python memory_report.py --sizes 1000 3000 -o report.json
+"""
+import argparse
+import json
+import random
+import tracemalloc
+from block import Block
+from cell_pool import FreeCellPool, bernoulli_indices
+
+
+def dict_backed(cls: type) -> type:
+    """
+    `__slots__`を持つクラスと同じ属性とメソッドを持ち，属性を`__dict__`に持つクラスを作る関数
+    元のクラスを継承すると属性が親の`__slots__`に入ったままになるため，継承せずに作る．
+    初期化は元のクラスのインスタンスを作り，全ての属性を写す．
+
+    Args:
+        cls (type): 元のクラス
+
+    Returns:
+        type: `__dict__`を持つクラス
+
+    Examples:
+        >>> block = dict_backed(Block)(1, 2)
+        >>> hasattr(Block(0, 0), "__dict__"), hasattr(block, "__dict__")
+        (False, True)
+        >>> isinstance(block, Block), block.now_x, block.icon
+        (False, 1, '🗻')
+        >>> sorted(vars(block))[:3]
+        ['icon', 'next_x', 'next_y']
+    """
+    slots = [
+        name for klass in reversed(cls.__mro__)
+        for name in getattr(klass, "__slots__", ())]
+    namespace = {}
+    for klass in reversed(cls.__mro__[:-1]):  # objectは除く
+        namespace.update({
+            name: value for name, value in vars(klass).items()
+            if name not in slots
+            and name not in ("__slots__", "__dict__", "__weakref__")})
+
+    def __init__(self, *args) -> None:
+        source = cls(*args)
+        for name in slots:
+            setattr(self, name, getattr(source, name))
+
+    namespace["__init__"] = __init__
+    return type(f"{cls.__name__}WithDict", (), namespace)
+
+
+def static_cells(
+        f_size: int,
+        rng: random.Random | None = None) -> list[tuple[int, int]]:
+    """
+    `Game.setup`と同じ規則で障害物の座標を生成する関数
+    壁の内側の各マスを確率で選び，埋まっていれば空いているマスに置き換える．
+    プレイヤー，敵，食べ物は置かないため，置き換えはゲームより少ない．
+
+    Args:
+        f_size (int): フィールドサイズ
+        rng (random.Random | None): 乱数生成器，Noneなら新しく作る
+
+    Returns:
+        list[tuple[int, int]]: 障害物の座標のリスト
+
+    Examples:
+        >>> cells = static_cells(50, random.Random(0))
+        >>> len(cells) == len(set(cells))
+        True
+        >>> all(1 <= x <= 48 and 1 <= y <= 48 for x, y in cells)
+        True
+    """
+    rng = rng or random.Random()
+    free_cells = FreeCellPool(1, 1, f_size - 2, f_size - 2, rng)
+    cells = []
+    side = max(f_size - 3, 0)  # 障害物の候補になる範囲の1辺
+    p = 1 - (1 - 1 / (f_size - 2)) ** 2
+    for i in bernoulli_indices(side * side, p, rng):
+        x, y = 1 + i // side, 1 + i % side
+        cells.append((x, y) if free_cells.take(x, y) else free_cells.sample())
+    return cells
+
+
+def measure(cells: list, cls: type) -> int:
+    """
+    障害物のインスタンスの生成で確保されたメモリを計測する関数
+    座標の生成は計測に含めず，インスタンスの分だけを計測する．
+
+    Args:
+        cells (list): 障害物の座標のリスト
+        cls (type): 障害物のクラス
+
+    Returns:
+        int: 確保したバイト数
+    """
+    tracemalloc.start()
+    blocks = [cls(x, y) for x, y in cells]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del blocks
+    return current
+
+
+def report(sizes: list[int]) -> list[dict]:
+    """
+    フィールドサイズごとに`__slots__`ありとなしのメモリ使用量を比較する関数
+
+    Args:
+        sizes (list[int]): フィールドサイズのリスト
+
+    Returns:
+        list[dict]: フィールドサイズごとの計測結果
+    """
+    rows = []
+    for f_size in sizes:
+        cells = static_cells(f_size, random.Random(f_size))
+        slotted = measure(cells, Block)
+        with_dict = measure(cells, dict_backed(Block))
+        rows.append({
+            "field_size": f_size,
+            "items": len(cells),
+            "slots_bytes": slotted,
+            "dict_bytes": with_dict,
+            "saved_bytes": with_dict - slotted,
+            "saved_ratio": 1 - slotted / with_dict,
+        })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes",
+        help="計測するフィールドサイズ",
+        type=int,
+        nargs="+",
+        default=[1000, 2000])
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="結果を書き出すjsonファイルのパス．指定がなければ表示のみ",
+        type=str,
+        default=None)
+    args = parser.parse_args()
+
+    rows = report(args.sizes)
+    print(f"{'field_size':>10} {'items':>8} {'__dict__':>12} "
+          f"{'__slots__':>12} {'saved':>12}")
+    for row in rows:
+        print(f"{row['field_size']:>10} {row['items']:>8} "
+              f"{row['dict_bytes']:>12,} {row['slots_bytes']:>12,} "
+              f"{row['saved_bytes']:>12,} ({row['saved_ratio']:.0%})")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+"""ソケット越しの複数人プレイ
+プレイヤーごとのTCPまたはUnixソケットの接続からキー入力を受け取り，
+asyncioのイベントループ1つで全員のゲームを進めるモジュール．
+ティックごとに届いているキーを待たずに1人1つずつ取り出してゲームを進め，
+差分描画のフレームを全員に送る．送信は書き込みバッファに積むだけで待たないため，
+読み込みの遅いクライアントがいてもティックの間隔は変わらない．
+
+Usage:
+    python netplay.py serve -p parameters.json --port 8765
+    python netplay.py join --port 8765
+    python netplay.py bench --players 48 --seconds 10
+    (serveとbenchの結果は result/<実行日時>/ に出力される)
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+from collections import deque
+from dataclasses import replace
+from config import common_args, Parameters
+from utils import dump_params, setup_params
+from utils import set_logging
+from game import Game, GAME_OVER, NEXT_STAGE
+from renderer import TerminalRenderer
+from scheduler import TickScheduler
+from instrument import LatencyHistogram
+from input_without_enter import KeyReader
+
+
+logger = logging.getLogger(__name__)
+
+WRITE_LIMIT = 64 * 1024  # 送りきれていないデータがこれを超えたクライアントには送らない
+KEYS = "wasd"  # ベンチマークのボットが押すキー
+
+
+class PlayerSlot:
+    """1人のプレイヤーの接続
+
+    Attributes:
+        index (int): プレイヤーの番号(`Game.players`の添字)
+        keys (deque[str]): 届いたがまだ使っていないキー．溢れたら古いキーから捨てる
+        writer (asyncio.StreamWriter | None): 接続，Noneなら未接続
+        synced (bool): 最後のフレームまで送れているか．Falseなら次は全体を送る
+    """
+
+    def __init__(self, index: int, maxlen: int = 4) -> None:
+        """
+        PlayerSlotクラスの初期化をする関数
+
+        Args:
+            index (int): プレイヤーの番号
+            maxlen (int): 溜めておくキーの最大数
+        """
+        self.index = index
+        self.keys: deque[str] = deque(maxlen=maxlen)
+        self.writer: asyncio.StreamWriter | None = None
+        self.synced = False
+
+
+class GameServer:
+    """複数人プレイのサーバ
+    `params.player_num`人分の席を用意し，全員が接続したらゲームを始める．
+    途中で切断したプレイヤーは何も入力しないまま残り，同じ席に接続し直せる．
+
+    Attributes:
+        params (Parameters): configのパラメータのインスタンス
+        game (Game): 進めるゲーム
+        renderer (TerminalRenderer): クライアントに送るフレームを作る差分描画
+        slots (list[PlayerSlot]): プレイヤーごとの接続
+        endless (bool): Trueならゲームオーバーの後も新しいゲームを始める
+        tick_times (LatencyHistogram): 1ティックの処理時間(送信まで)
+        overruns (int): ティックの予定時刻に間に合わなかった回数
+        ready (asyncio.Event): 全員が接続したらセットされる
+
+    Examples:
+        >>> params = Parameters(field_size=8, enemy_num=0, player_num=2)
+        >>> server = GameServer(params)
+        >>> server.slots[1].keys.extend("wd")
+        >>> server.poll(), server.poll()
+        (['', 'w'], ['', 'd'])
+    """
+
+    def __init__(
+            self,
+            params: Parameters,
+            endless: bool = False,
+            replay_path: str | None = None) -> None:
+        """
+        GameServerクラスの初期化をする関数
+
+        Args:
+            params (Parameters): configのパラメータのインスタンス
+            endless (bool): Trueならゲームオーバーの後も新しいゲームを始める
+            replay_path (str | None): リプレイの書き出し先，Noneなら記録しない
+        """
+        # フィールドの更新は必要なため描画ありで作り，描画先だけをクライアントにする
+        self.params = replace(params, headless=False)
+        self.game = Game(self.params, replay_path=replay_path, autostart=False)
+        self.renderer = TerminalRenderer(encoding="utf-8")
+        self.game.renderer = self.renderer
+        self.slots = [PlayerSlot(i) for i in range(params.player_num)]
+        self.endless = endless
+        self.tick_times = LatencyHistogram()
+        self.overruns = 0
+        self.ready = asyncio.Event()
+        self._handlers: set[asyncio.Task] = set()  # 接続を受け持っているタスク
+
+    async def handle(
+            self,
+            reader: asyncio.StreamReader,
+            writer: asyncio.StreamWriter) -> None:
+        """
+        1つの接続を受け持つコルーチン
+        空いている席に割り当て，切断されるまで届いたキーを席に溜める．
+
+        Args:
+            reader (asyncio.StreamReader): 接続からの読み込み
+            writer (asyncio.StreamWriter): 接続への書き込み
+        """
+        slot = next((s for s in self.slots if s.writer is None), None)
+        if slot is None:
+            writer.write(b"server is full\n")
+            writer.close()
+            return
+        self._handlers.add(asyncio.current_task())
+        slot.keys.clear()
+        slot.synced = False
+        slot.writer = writer
+        writer.write(f"player {slot.index + 1}\n".encode())
+        logger.info(f"player {slot.index + 1} connected")
+        if all(s.writer is not None for s in self.slots):
+            self.ready.set()
+        try:
+            while data := await reader.read(1024):
+                slot.keys.extend(data.decode(errors="ignore"))
+        except ConnectionError:
+            pass
+        finally:
+            logger.info(f"player {slot.index + 1} disconnected")
+            if slot.writer is writer:
+                slot.writer = None
+            writer.close()
+            self._handlers.discard(asyncio.current_task())
+
+    def poll(self) -> list[str]:
+        """
+        プレイヤーごとに，届いているキーを古い順に1つずつ取り出すメソッド
+        キーがなければ待たずに空文字とする．
+
+        Returns:
+            list[str]: プレイヤーごとのキー
+        """
+        return [slot.keys.popleft() if slot.keys else ""
+                for slot in self.slots]
+
+    def broadcast(self, frame: bytes) -> None:
+        """
+        接続している全員にフレームを送るメソッド
+        送りきれていないデータが`WRITE_LIMIT`を超えたクライアントには送らず，
+        追いついてから画面全体を送り直す．
+
+        Args:
+            frame (bytes): 前のフレームからの差分
+        """
+        for slot in self.slots:
+            writer = slot.writer
+            if writer is None or writer.is_closing():
+                continue
+            if writer.transport.get_write_buffer_size() > WRITE_LIMIT:
+                slot.synced = False
+                continue
+            writer.write(frame if slot.synced else self.renderer.full_frame())
+            slot.synced = True
+
+    async def run(self, ticks: int | None = None) -> int:
+        """
+        全員が接続するのを待ってから，一定の間隔でゲームを進めるコルーチン
+
+        Args:
+            ticks (int | None): 進めるティック数，Noneならゲームが終わるまで
+
+        Returns:
+            int: 進めたティック数
+        """
+        await self.ready.wait()
+        game = self.game
+        scheduler = TickScheduler(
+            self.params.tick_interval, clock=asyncio.get_running_loop().time)
+        count = 0
+        while ticks is None or count < ticks:
+            begin = time.perf_counter_ns()
+            outcome = game.step(self.poll())
+            self.broadcast(self.renderer.compose(game.field))
+            if outcome == NEXT_STAGE:
+                # 次のフレームは新しいフィールドなので全体が送られる
+                game.next_stage(self.params)
+            self.tick_times.record(time.perf_counter_ns() - begin)
+            count += 1
+            if outcome == GAME_OVER:
+                logger.info(f"Game Over! Clear Stage: {game.clear_count}")
+                self.broadcast(
+                    f"Game Over! Clear Stage: {game.clear_count}\n".encode())
+                if not self.endless:
+                    break
+                game.clear_count = 0
+                game.setup(self.params)
+            await asyncio.sleep(scheduler.delay())
+        self.overruns = scheduler.overruns
+        return count
+
+    async def close(self) -> None:
+        """全ての接続を閉じて接続の処理が終わるのを待ち，ゲームの記録を閉じるコルーチン"""
+        for slot in self.slots:
+            if slot.writer is not None:
+                slot.writer.close()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        self.game.close()
+
+
+async def serve(
+        server: GameServer,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        unix: str | None = None) -> None:
+    """
+    接続を待ち受けてゲームを実行するコルーチン
+
+    Args:
+        server (GameServer): 実行するサーバ
+        host (str): 待ち受けるアドレス
+        port (int): 待ち受けるポート
+        unix (str | None): Unixソケットのパス，指定すればTCPの代わりに使う
+    """
+    if unix:
+        listener = await asyncio.start_unix_server(server.handle, path=unix)
+    else:
+        listener = await asyncio.start_server(server.handle, host, port)
+    async with listener:
+        logger.info(f"waiting for {len(server.slots)} players on "
+                    f"{unix or f'{host}:{port}'}")
+        try:
+            await server.run()
+        finally:
+            await server.close()
+
+
+async def join(
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        unix: str | None = None) -> None:
+    """
+    サーバに接続してプレイするコルーチン
+    キー入力はエンターを待たずにそのまま送り，届いたフレームはそのまま標準出力に書く．
+
+    Args:
+        host (str): サーバのアドレス
+        port (int): サーバのポート
+        unix (str | None): Unixソケットのパス，指定すればTCPの代わりに使う
+    """
+    if unix:
+        reader, writer = await asyncio.open_unix_connection(unix)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    loop = asyncio.get_running_loop()
+    out = sys.stdout.buffer
+    with KeyReader() as keys:
+        fd = keys.stream.fileno()
+
+        def forward() -> None:
+            """届いているキーをサーバに送る"""
+            data = os.read(fd, 1024)
+            if data:
+                writer.write(data)
+            else:
+                loop.remove_reader(fd)
+
+        loop.add_reader(fd, forward)
+        try:
+            while data := await reader.read(65536):
+                out.write(data)
+                out.flush()
+        finally:
+            loop.remove_reader(fd)
+            writer.close()
+
+
+async def bench(params: Parameters, players: int, seconds: float) -> dict:
+    """
+    同じプロセスの中でサーバとボットのクライアントを動かし，ティックの間隔が保てるかを計測する
+    ボットは毎ティック1つずつランダムにキーを送り，届いたフレームを読み捨てる．
+
+    Args:
+        params (Parameters): configのパラメータのインスタンス
+        players (int): プレイヤー(ボット)の数
+        seconds (float): 計測する時間(秒)
+
+    Returns:
+        dict: ティック数，間に合わなかった回数，1ティックの処理時間，受信したバイト数
+    """
+    server = GameServer(replace(params, player_num=players), endless=True)
+    rng = random.Random(0)
+    listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+
+    async def bot() -> int:
+        """ランダムにキーを送り続け，受信したバイト数を返す"""
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+        async def press() -> None:
+            while True:
+                writer.write(rng.choice(KEYS).encode())
+                await asyncio.sleep(params.tick_interval)
+
+        presser = asyncio.create_task(press())
+        received = 0
+        try:
+            while data := await reader.read(65536):
+                received += len(data)
+        finally:
+            presser.cancel()
+            writer.close()
+        return received
+
+    ticks = max(1, round(seconds / params.tick_interval))
+    async with listener:
+        bots = [asyncio.create_task(bot()) for _ in range(players)]
+        await server.ready.wait()
+        begin = time.perf_counter()
+        count = await server.run(ticks)
+        elapsed = time.perf_counter() - begin
+        await server.close()
+        received = await asyncio.gather(*bots)
+    return {
+        "players": players,
+        "tick_interval": params.tick_interval,
+        "ticks": count,
+        "elapsed": elapsed,
+        "overruns": server.overruns,
+        "tick": server.tick_times.summary(),
+        "bytes_per_player": sum(received) / players,
+    }
+
+
+def main() -> None:
+
+    # コマンドライン引数の設定
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+    server_parser = common_args(
+        commands.add_parser("serve", help="プレイヤーの接続を待ってゲームを実行する"))
+    join_parser = commands.add_parser("join", help="サーバに接続してプレイする")
+    for sub in (server_parser, join_parser):
+        sub.add_argument("--host", help="アドレス", default="127.0.0.1")
+        sub.add_argument("--port", help="ポート", type=int, default=8765)
+        sub.add_argument(
+            "--unix", help="Unixソケットのパス．指定すればTCPの代わりに使う", default=None)
+    bench_parser = common_args(
+        commands.add_parser("bench", help="ボットを接続してティックの間隔が保てるかを計測する"))
+    bench_parser.add_argument(
+        "--players", help="プレイヤー(ボット)の数", type=int, default=48)
+    bench_parser.add_argument(
+        "--seconds", help="計測する時間(秒)", type=float, default=10.0)
+    args = parser.parse_args()
+
+    if args.command == "join":
+        asyncio.run(join(args.host, args.port, args.unix))
+        return
+
+    params = Parameters(**setup_params(vars(args), args.parameters))
+    if args.command == "bench":
+        # 全員が入れる広さのフィールドで計測する
+        size = max(params.field_size, int((4 * args.players) ** 0.5) + 2)
+        params = replace(params, field_size=size, player_num=args.players)
+
+    # 結果出力用ファイルの作成
+    result_dir = f'result/{params.run_date}'  # 結果出力ディレクトリ
+    os.mkdir(result_dir)  # 実行日時を名前とするディレクトリを作成
+    dump_params(params, f'{result_dir}')  # パラメータを出力
+
+    # ログ設定
+    set_logging(result_dir)  # ログを標準出力とファイルに出力するよう設定
+    logger.info(params)
+
+    if args.command == "bench":
+        logging.getLogger("game").setLevel(logging.WARNING)  # 1ゲームごとのログは出さない
+        report = asyncio.run(bench(params, args.players, args.seconds))
+        with open(f'{result_dir}/bench.json', 'w') as f:
+            json.dump(report, f, indent=4)
+        logger.info(report)
+        return
+
+    server = GameServer(params, replay_path=f'{result_dir}/replay.bin')
+    asyncio.run(serve(server, args.host, args.port, args.unix))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""占有インデックス
+マス目の座標からそのマスにいるアイテムを定数時間で引くためのモジュール
+"""
+from item import Item
+
+
+class OccupancyIndex:
+    """レイヤごとの占有インデックス
+    座標(x, y)をキーとして，そのマスにいるアイテムを保持するクラス．
+    アイテムの`update_pos`と連動して更新される．
+
+    Attributes:
+        cells (dict[tuple[int, int], list[Item]]): 座標ごとのアイテムのリスト
+
+    Examples:
+        >>> index = OccupancyIndex()
+        >>> a = Item(1, 2)
+        >>> index.add(a)
+        >>> index.get(1, 2) is a
+        True
+        >>> a.next_x = 2
+        >>> a.update_pos()
+        >>> index.get(1, 2) is None
+        True
+        >>> index.get(2, 2) is a
+        True
+    """
+
+    def __init__(self, items: list[Item] | None = None) -> None:
+        """
+        OccupancyIndexクラスの初期化をする関数
+
+        Args:
+            items (list[Item] | None): 最初に登録するアイテムのリスト
+        """
+        self.cells: dict[tuple[int, int], list[Item]] = {}
+        for item in items or []:
+            self.add(item)
+
+    def add(self, item: Item) -> None:
+        """
+        アイテムを現在の座標に登録するメソッド
+
+        Args:
+            item (Item): 登録するアイテム
+        """
+        self.cells.setdefault((item.now_x, item.now_y), []).append(item)
+        item.occupancy = self
+
+    def remove(self, item: Item) -> None:
+        """
+        アイテムの登録を解除するメソッド
+
+        Args:
+            item (Item): 登録を解除するアイテム
+
+        Examples:
+            >>> index = OccupancyIndex()
+            >>> a = Item(0, 0)
+            >>> index.add(a)
+            >>> index.remove(a)
+            >>> index.get(0, 0) is None
+            True
+            >>> a.occupancy is None
+            True
+        """
+        self._discard(item, item.now_x, item.now_y)
+        item.occupancy = None
+
+    def move(
+            self,
+            item: Item,
+            old_x: int,
+            old_y: int,
+            new_x: int,
+            new_y: int) -> None:
+        """
+        アイテムの登録位置を移動するメソッド
+        `Item.update_pos`から呼び出される．
+
+        Args:
+            item (Item): 移動するアイテム
+            old_x (int): 移動前のx座標
+            old_y (int): 移動前のy座標
+            new_x (int): 移動後のx座標
+            new_y (int): 移動後のy座標
+        """
+        self._discard(item, old_x, old_y)
+        self.cells.setdefault((new_x, new_y), []).append(item)
+
+    def get(self, x: int, y: int) -> Item | None:
+        """
+        指定したマスにいるアイテムを返すメソッド
+
+        Args:
+            x (int): x座標
+            y (int): y座標
+
+        Returns:
+            Item | None: マスにいるアイテム，いなければNone
+        """
+        items = self.cells.get((x, y))
+        if items:
+            return items[0]
+        return None
+
+    def items_at(self, x: int, y: int) -> list[Item]:
+        """
+        指定したマスにいるアイテムを全て返すメソッド
+
+        Args:
+            x (int): x座標
+            y (int): y座標
+
+        Returns:
+            list[Item]: マスにいるアイテムのリスト
+        """
+        return self.cells.get((x, y), [])
+
+    def _discard(self, item: Item, x: int, y: int) -> None:
+        """座標(x, y)のリストからアイテムを取り除く"""
+        items = self.cells.get((x, y))
+        if items is None:
+            return
+        for i, registered in enumerate(items):
+            if registered is item:
+                del items[i]
+                break
+        if not items:
+            del self.cells[(x, y)]
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -17,6 +17,8 @@ class Player(Item):
         self.status(bool) : アイテムの状態(True>存在,False>存在しない・消滅した)
     """
 
+    __slots__ = ()
+
     def __init__(self, x, y) -> None:
         """一変数とプレイヤーアイコンを設定"""
         super().__init__(x, y)
@@ -0,0 +1,294 @@
+"""差分描画
+フィールドの各行をエンコード済みのバイト列として記録しておき，
+前回のフレームから変化したマスのある行だけを作り直してANSIエスケープシーケンスで描き直すモジュール．
+行は型付きのマス目(`Field.cell_ids`)の値でアイコンの表(パレット)を引いて作る．
+"""
+import sys
+import shutil
+from typing import TextIO
+from field import Field, HELP_LINES, PALETTE
+from grid import display_width
+
+
+CLEAR = b"\x1b[H\x1b[2J"  # カーソルを左上に移動して画面をクリアする
+
+
+class TerminalRenderer:
+    """ターミナルに差分描画するクラス
+    新しいフィールドを受け取ったときは画面をクリアして操作方法と全ての行を描き，
+    それ以降は`Field.dirty`に記録されたマスのある行だけを作り直して，行の先頭から描き直す．
+    行は型付きのマス目の値をパレットで引いてアイコンにして作る．
+    パレットのアイコンは全て表示幅2のため，行の表示幅はそろっている．
+    1フレーム分の出力はバイト列にまとめて1回の`write`で書き出す．
+
+    Attributes:
+        stream (TextIO): 出力先
+        cell_width (int): 1マスの表示幅(絵文字と全角空白は2)
+        encoding (str): 出力の文字コード
+
+    Examples:
+        >>> import io
+        >>> from player import Player
+        >>> p = Player(1, 1)
+        >>> field = Field([p], [], [], [], [], 3)
+        >>> out = io.StringIO()
+        >>> renderer = TerminalRenderer(out)
+        >>> renderer.render(field)
+        >>> out.getvalue().startswith("\\x1b[H\\x1b[2J")
+        True
+        >>> _ = out.truncate(0), out.seek(0)
+        >>> p.next_x = 2
+        >>> p.update_pos()
+        >>> _ = field.update_field()
+        >>> renderer.render(field)
+        >>> out.getvalue()
+        '\\x1b[6;1H\\u3000\\u3000😶\\x1b[8;1H'
+        >>> renderer.render(field)  # 何も変わらなければカーソル移動だけ
+        >>> out.getvalue()[-6:]
+        '\\x1b[8;1H'
+    """
+
+    def __init__(
+            self,
+            stream: TextIO | None = None,
+            cell_width: int = 2,
+            encoding: str | None = None):
+        """
+        TerminalRendererクラスの初期化をする関数
+
+        Args:
+            stream (TextIO | None): 出力先，Noneなら標準出力
+            cell_width (int): 1マスの表示幅
+            encoding (str | None): 出力の文字コード，Noneなら出力先に合わせる
+        """
+        self.stream = stream if stream is not None else sys.stdout
+        self.cell_width = cell_width
+        self.encoding = (
+            encoding or getattr(self.stream, "encoding", None) or "utf-8")
+        self._field: Field | None = None
+        self._view = (0, 0, 0, 0)  # 描いている範囲(左上のx, y座標，幅，高さ)
+        self._rows: list[bytes] = []  # 描いている範囲の各行のバイト列
+        self._width = 0  # 行をそろえる表示幅
+        self._help = "".join(
+            line + "\n" for line in HELP_LINES).encode(self.encoding)
+        # マスの種類(を1文字にしたもの) -> アイコン
+        self._palette = str.maketrans(dict(enumerate(PALETTE)))
+        self._ids: memoryview | None = None  # 型付きのマス目(1次元)
+
+    def render(self, field: Field) -> None:
+        """
+        フィールドを描画するメソッド
+
+        Args:
+            field (Field): 描画するフィールド
+        """
+        self._write(self.compose(field))
+
+    def compose(self, field: Field) -> bytes:
+        """
+        1フレーム分の出力をバイト列で作るメソッド
+
+        Args:
+            field (Field): 描画するフィールド
+
+        Returns:
+            bytes: 1フレーム分の出力
+        """
+        top = len(HELP_LINES) + 1  # 描く範囲の1行目の行番号
+        view = self._frame(field)
+        x0, y0, width, height = view
+        if field is not self._field or field.redraw or view != self._view:
+            # 新しいフィールドか，描く範囲が変わった場合は全体を描く
+            self._field = field
+            self._view = view
+            field.redraw = False
+            field.take_dirty()
+            self._rows = self._full_rows(field, view)
+            return self.full_frame()
+        # 描く範囲の中で変化したマスのある行だけを作り直す
+        changed = sorted({
+            y - y0 for x, y in field.take_dirty()
+            if x0 <= x < x0 + width and y0 <= y < y0 + height})
+        parts = []
+        for row in changed:
+            self._rows[row] = self._row(field, x0, y0 + row, width)
+            parts.append(f"\x1b[{top + row};1H".encode() + self._rows[row])
+        # 後続の出力のためにカーソルを描く範囲の下に移動
+        parts.append(f"\x1b[{top + height};1H".encode())
+        return b"".join(parts)
+
+    def full_frame(self) -> bytes:
+        """
+        最後に`compose`したフレームを，画面をクリアして全体を描く出力で返すメソッド
+        途中から描き始める出力先(後から接続したクライアントなど)に使う．
+
+        Returns:
+            bytes: 画面全体の出力
+        """
+        return CLEAR + self._help + b"".join(row + b"\n" for row in self._rows)
+
+    def _frame(self, field: Field) -> tuple[int, int, int, int]:
+        """描く範囲(左上のx, y座標，幅，高さ)を返す．フィールド全体を描く"""
+        return (0, 0, field.f_size, field.f_size)
+
+    def _full_rows(
+            self,
+            field: Field,
+            view: tuple[int, int, int, int]) -> list[bytes]:
+        """描く範囲の全ての行を作る"""
+        self._ids = field.cell_ids().cast("B")
+        x0, y0, width, height = view
+        f_size = field.f_size
+        # 範囲全体を1回でパレットに通してから，行ごとに切り出す
+        text = self._lookup(self._ids[y0 * f_size:(y0 + height) * f_size])
+        return [
+            text[i + x0:i + x0 + width].encode(self.encoding)
+            for i in range(0, height * f_size, f_size)]
+
+    def _row(self, field: Field, x0: int, y: int, width: int) -> bytes:
+        """型付きのマス目の1行の一部を，パレットを引いてバイト列にする"""
+        start = y * field.f_size + x0
+        return self._lookup(
+            self._ids[start:start + width]).encode(self.encoding)
+
+    def _lookup(self, ids: memoryview) -> str:
+        """マスの種類の並びを，1バイトを1文字として読んでアイコンの文字列にする"""
+        return ids.tobytes().decode("latin-1").translate(self._palette)
+
+    def _encode(self, line: str) -> bytes:
+        """行を表示幅でそろえてエンコードする"""
+        padding = max(self._width - display_width(line), 0)
+        return (line + " " * padding).encode(self.encoding)
+
+    def _write(self, data: bytes) -> None:
+        """バイト列を1回で書き出す．バイナリの出力先がなければ文字列にして書く"""
+        buffer = getattr(self.stream, "buffer", None)
+        if buffer is not None:
+            self.stream.flush()
+            buffer.write(data)
+            buffer.flush()
+        else:
+            self.stream.write(data.decode(self.encoding))
+            self.stream.flush()
+
+
+class ViewportRenderer(TerminalRenderer):
+    """プレイヤーの周りだけを描画するクラス
+    ターミナルに収まる大きさの窓をフィールドに置き，窓の中だけを描く．
+    プレイヤーが窓の端に近づくと，プレイヤーが中央に来るように窓を動かして全体を描き直す．
+    窓が動かない間は，窓の中で変化したマスのある行だけを描き直す．
+    1フレームの処理は窓の大きさと変化したマスの数に比例し，フィールドの大きさによらない．
+    フィールド全体の型付きのマス目を作らないように，窓の中は文字列のマス目から読む．
+
+    Attributes:
+        stream (TextIO): 出力先
+        cell_width (int): 1マスの表示幅(絵文字と全角空白は2)
+        width (int | None): 窓の幅(マス)，Noneならターミナルの大きさに合わせる
+        height (int | None): 窓の高さ(マス)，Noneならターミナルの大きさに合わせる
+        origin (tuple[int, int]): 窓の左上のマスの座標
+
+    Examples:
+        >>> import io
+        >>> from player import Player
+        >>> p = Player(50, 50)
+        >>> field = Field([p], [], [], [], [], 1000)
+        >>> out = io.StringIO()
+        >>> renderer = ViewportRenderer(out, width=5, height=3)
+        >>> renderer.render(field)
+        >>> renderer.origin
+        (48, 49)
+        >>> print(*out.getvalue().split("\\n")[-4:-1], sep="|")
+        　　　　　|　　😶　　|　　　　　
+        >>> _ = out.truncate(0), out.seek(0)
+        >>> p.next_x = 51
+        >>> p.update_pos()
+        >>> _ = field.update_field()
+        >>> renderer.render(field)
+        >>> out.getvalue()
+        '\\x1b[6;1H\\u3000\\u3000\\u3000😶\\u3000\\x1b[8;1H'
+        >>> p.next_x = 53
+        >>> p.update_pos()
+        >>> _ = field.update_field()
+        >>> renderer.render(field)
+        >>> renderer.origin
+        (51, 49)
+    """
+
+    def __init__(
+            self,
+            stream: TextIO | None = None,
+            cell_width: int = 2,
+            width: int | None = None,
+            height: int | None = None):
+        """
+        ViewportRendererクラスの初期化をする関数
+
+        Args:
+            stream (TextIO | None): 出力先，Noneなら標準出力
+            cell_width (int): 1マスの表示幅
+            width (int | None): 窓の幅(マス)，Noneならターミナルの大きさに合わせる
+            height (int | None): 窓の高さ(マス)，Noneならターミナルの大きさに合わせる
+        """
+        super().__init__(stream, cell_width)
+        self.width = width
+        self.height = height
+        self.origin = (0, 0)
+
+    def _frame(self, field: Field) -> tuple[int, int, int, int]:
+        """窓の大きさを決め，プレイヤーに合わせて動かした窓を返す"""
+        width, height = self._window_size(field)
+        self.origin = self._follow(field, width, height)
+        return (*self.origin, width, height)
+
+    def _window_size(self, field: Field) -> tuple[int, int]:
+        """窓の幅と高さを，ターミナルとフィールドに収まるように決める"""
+        columns, lines = shutil.get_terminal_size()
+        width = self.width or columns // self.cell_width
+        # 操作方法と，描画後のカーソルの行を除いた高さ
+        height = self.height or lines - len(HELP_LINES) - 1
+        return (max(1, min(width, field.f_size)),
+                max(1, min(height, field.f_size)))
+
+    def _follow(
+            self,
+            field: Field,
+            width: int,
+            height: int) -> tuple[int, int]:
+        """
+        生きているプレイヤーが窓の端の4分の1に入ったら，
+        プレイヤーが中央に来る窓の左上の座標を返す．それ以外は今の座標を返す
+        """
+        x0, y0 = self.origin
+        for player in field.players:
+            if player.status:
+                x, y = player.now_x, player.now_y
+                break
+        else:
+            return self.origin
+        margin_x, margin_y = width // 4, height // 4
+        if field is not self._field \
+                or not x0 + margin_x <= x < x0 + width - margin_x \
+                or not y0 + margin_y <= y < y0 + height - margin_y:
+            x0, y0 = x - width // 2, y - height // 2
+        # 窓がフィールドからはみ出さないようにする
+        x0 = max(0, min(x0, field.f_size - width))
+        y0 = max(0, min(y0, field.f_size - height))
+        return (x0, y0)
+
+    def _full_rows(
+            self,
+            field: Field,
+            view: tuple[int, int, int, int]) -> list[bytes]:
+        """窓の全ての行を文字列のマス目から作り，最も広い行の表示幅にそろえる"""
+        lines = field.field.window(*view)
+        self._width = max(map(display_width, lines), default=0)
+        return [self._encode(line) for line in lines]
+
+    def _row(self, field: Field, x0: int, y: int, width: int) -> bytes:
+        """窓の1行を文字列のマス目から作る"""
+        return self._encode(field.field.window(x0, y, width, 1)[0])
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,211 @@
+"""リプレイの記録と再生
+シードと1ティックごとのキー入力(1プレイヤーあたり1バイト)を
+バイナリファイルに記録し，ヘッドレスで最高速に再現するモジュール．
+
+ファイルの形式(リトルエンディアン):
+    ヘッダ: マジック b"PMRP"，バージョン(uint8)，プレイヤー数(uint8)，
+        シード(uint64)，field_size(uint32)，enemy_num(uint32)，food_num(uint32)，
+        敵を動かす方法(uint8，0: python，1: numpy)，敵の動き方(uint8，0: random，1: chase)
+    本体: ティックごとにプレイヤー数分のキーの番号(uint8，`KEYS`の添字)
+
+Usage:
+    python replay.py result/20240101_000000/replay.bin
+"""
+from __future__ import annotations
+import struct
+import argparse
+from dataclasses import dataclass
+from typing import BinaryIO
+from typing import TYPE_CHECKING
+from config import Parameters
+from headless import Policy
+if TYPE_CHECKING:
+    from headless import GameResult
+
+
+MAGIC = b"PMRP"
+VERSION = 3  # ステージの生成方法を変えたときに上げる(古いリプレイは同じゲームにならない)
+HEADER = struct.Struct("<4sBBQIIIBB")
+# キーの番号．w, a, s, d 以外のキーは動かないキーとして0番で記録する
+KEYS = ("", "w", "a", "s", "d")
+KEY_CODES = {key: code for code, key in enumerate(KEYS)}
+ENGINES = ("python", "numpy")
+POLICIES = ("random", "chase")
+
+
+@dataclass(frozen=True)
+class Replay:
+    """
+    読み込んだリプレイを保持するクラス
+
+    Attributes:
+        seed (int): 乱数のシード
+        players (int): プレイヤー数
+        field_size (int): フィールドサイズ
+        enemy_num (int): 敵の数
+        food_num (int): 食べ物の数
+        enemy_engine (str): 敵を動かす方法
+        enemy_policy (str): 敵の動き方
+        inputs (bytes): キーの番号の列
+    """
+    seed: int
+    players: int
+    field_size: int
+    enemy_num: int
+    food_num: int
+    enemy_engine: str
+    enemy_policy: str
+    inputs: bytes
+
+    @property
+    def ticks(self) -> int:
+        """記録されているティック数"""
+        return len(self.inputs) // self.players
+
+    def parameters(self) -> Parameters:
+        """
+        リプレイを再現するためのパラメータを返すメソッド
+
+        Returns:
+            Parameters: ヘッドレスで上限なしに実行するパラメータ
+        """
+        return Parameters(
+            field_size=self.field_size,
+            enemy_num=self.enemy_num,
+            food_num=self.food_num,
+            enemy_engine=self.enemy_engine,
+            enemy_policy=self.enemy_policy,
+            player_num=self.players,
+            seed=self.seed,
+            headless=True,
+            max_ticks=0)
+
+    def policy(self) -> Policy:
+        """
+        記録されたキーを順に返す入力方針を返すメソッド
+
+        Returns:
+            Policy: 入力方針．記録が終わるとNoneを返す
+        """
+        keys = iter([KEYS[code] for code in self.inputs])
+        return lambda game: next(keys, None)
+
+
+class ReplayRecorder:
+    """リプレイを記録するクラス
+    ヘッダを書いたあと，ティックごとのキーを1バイトずつ追記する．
+    書き込みはファイルのバッファにまとめられる．
+
+    Examples:
+        >>> import io
+        >>> out = io.BytesIO()
+        >>> params = Parameters(seed=7, enemy_policy="chase")
+        >>> recorder = ReplayRecorder(out, params, 7, 1)
+        >>> recorder.record(["w"])
+        >>> recorder.record(["x"])
+        >>> replay = load(io.BytesIO(out.getvalue()))
+        >>> replay.seed, replay.ticks, replay.inputs
+        (7, 2, b'\\x01\\x00')
+        >>> replay.parameters().enemy_policy
+        'chase'
+    """
+
+    def __init__(
+            self,
+            stream: BinaryIO,
+            params: Parameters,
+            seed: int,
+            players: int) -> None:
+        """
+        ReplayRecorderクラスの初期化をする関数
+
+        Args:
+            stream (BinaryIO): 書き込み先
+            params (Parameters): configのパラメータのインスタンス
+            seed (int): 実際に使った乱数のシード
+            players (int): プレイヤー数
+        """
+        self.stream = stream
+        self.stream.write(HEADER.pack(
+            MAGIC,
+            VERSION,
+            players,
+            seed,
+            params.field_size,
+            params.enemy_num,
+            params.food_num,
+            ENGINES.index(params.enemy_engine),
+            POLICIES.index(params.enemy_policy)))
+
+    def record(self, keys: list[str]) -> None:
+        """
+        1ティック分のキーを記録するメソッド
+
+        Args:
+            keys (list[str]): プレイヤーごとに押されたキー
+        """
+        self.stream.write(bytes(KEY_CODES.get(key, 0) for key in keys))
+
+    def close(self) -> None:
+        """書き込み先を閉じるメソッド"""
+        self.stream.close()
+
+
+def load(stream: BinaryIO) -> Replay:
+    """
+    リプレイを読み込む関数
+
+    Args:
+        stream (BinaryIO): 読み込み元
+
+    Returns:
+        Replay: 読み込んだリプレイ
+
+    Raises:
+        ValueError: リプレイのファイルでない場合
+    """
+    data = stream.read()
+    if len(data) < HEADER.size:
+        raise ValueError("replay file is too short")
+    (magic, version, players, seed, f_size, e_num, f_num, engine,
+     policy) = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a replay file")
+    return Replay(
+        seed=seed,
+        players=players,
+        field_size=f_size,
+        enemy_num=e_num,
+        food_num=f_num,
+        enemy_engine=ENGINES[engine],
+        enemy_policy=POLICIES[policy],
+        inputs=data[HEADER.size:])
+
+
+def run(path: str) -> GameResult:
+    """
+    リプレイをヘッドレスで再現する関数
+
+    Args:
+        path (str): リプレイのファイルのパス
+
+    Returns:
+        GameResult: 再現したゲームの結果
+    """
+    from game import Game
+    with open(path, "rb") as f:
+        replay = load(f)
+    return Game(replay.parameters(), replay.policy()).result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", help="リプレイのファイルのパス", type=str)
+    args = parser.parse_args()
+    result = run(args.path)
+    print(result)
+    print(f"ticks/sec: {result.ticks_per_sec:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""ティックの時間管理
+1ティックにかかった処理時間を差し引いて待ち，一定の間隔でティックを進めるモジュール
+"""
+import time
+from typing import Callable
+
+
+class TickScheduler:
+    """固定間隔のティックスケジューラ
+    次のティックの予定時刻を保持し，`wait`で予定時刻まで待つ．
+    処理に時間がかかった分だけ待ち時間を短くするため，ティックの間隔が一定に保たれる．
+    予定時刻を過ぎていた場合は待たずに進み，遅れを取り戻そうとまとめて進めることはしない．
+
+    Attributes:
+        interval (float): ティックの間隔(秒)
+        overruns (int): 予定時刻に間に合わなかった回数
+
+    Examples:
+        >>> now = [0.0]
+        >>> def sleep(sec):
+        ...     now[0] += sec
+        >>> scheduler = TickScheduler(0.3, clock=lambda: now[0], sleep=sleep)
+        >>> now[0] += 0.1  # 処理に0.1秒かかった
+        >>> scheduler.wait()
+        >>> round(now[0], 3)
+        0.3
+        >>> now[0] += 0.5  # 処理が間隔より長くかかった
+        >>> scheduler.wait()
+        >>> round(now[0], 3), scheduler.overruns
+        (0.8, 1)
+        >>> scheduler.wait()
+        >>> round(now[0], 3)
+        1.1
+    """
+
+    def __init__(
+            self,
+            interval: float,
+            clock: Callable[[], float] = time.monotonic,
+            sleep: Callable[[float], None] = time.sleep) -> None:
+        """
+        TickSchedulerクラスの初期化をする関数
+
+        Args:
+            interval (float): ティックの間隔(秒)
+            clock (Callable[[], float]): 現在時刻を返す関数
+            sleep (Callable[[float], None]): 指定した秒数待つ関数
+        """
+        self.interval = interval
+        self.overruns = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._next = clock() + interval  # 次のティックの予定時刻
+
+    def wait(self) -> None:
+        """
+        次のティックの予定時刻まで待つメソッド
+        """
+        delay = self.delay()
+        if delay > 0:
+            self._sleep(delay)
+
+    def delay(self) -> float:
+        """
+        次のティックの予定時刻までの秒数を返し，その次の予定時刻を決めるメソッド
+        自分では待たないため，asyncioのイベントループでは`asyncio.sleep`に渡して使う．
+
+        Returns:
+            float: 待つ秒数．予定時刻を過ぎていれば0
+
+        Examples:
+            >>> now = [0.0]
+            >>> scheduler = TickScheduler(0.3, clock=lambda: now[0])
+            >>> now[0] += 0.1
+            >>> round(scheduler.delay(), 3)
+            0.2
+        """
+        delay = self._next - self._clock()
+        if delay > 0:
+            self._next += self.interval
+            return delay
+        # 間に合わなかった場合は，今から1間隔後を次の予定とする
+        self.overruns += 1
+        self._next = self._clock() + self.interval
+        return 0.0
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,446 @@
+"""複数セッションのホスト
+1つのプロセスのasyncioのイベントループで，独立した多数のゲームを同時に進めるモジュール．
+ゲームは描画とキー入力なしで作り，セッションごとのタスクがティックスケジューラの間隔で
+1ティックずつ進める．セッションの作成と破棄はゲームの初期設定とタスク1つ分で済む．
+
+Usage:
+    python sessions.py -p parameters.json --seconds 10
+    python sessions.py --start 500 --limit 64000
+    (結果は result/<実行日時>/ の load_test.json と log.log に出力される)
+"""
+import gc
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import itertools
+from collections import deque
+from dataclasses import replace
+from types import FunctionType, ModuleType
+from typing import Any, Callable, Iterable
+from config import common_args, Parameters
+from utils import dump_params, setup_params
+from utils import set_logging
+from game import Game, GAME_OVER, NEXT_STAGE
+from headless import GameResult, Policy, random_policy
+from scheduler import TickScheduler
+from instrument import LatencyHistogram
+
+
+logger = logging.getLogger(__name__)
+
+GOLDEN = 0.618033988749895  # セッションの開始をずらすための黄金比の小数部分
+
+
+def deep_sizeof(root: Any, shared: Iterable[Any] = ()) -> int:
+    """
+    オブジェクトから参照をたどって届く全てのオブジェクトのバイト数の合計を返す関数
+    クラスとモジュールは全体で共有されるため数えず，関数はクロージャの変数だけをたどる．
+
+    Args:
+        root (Any): 数え始めるオブジェクト
+        shared (Iterable[Any]): 他と共有していて数えないオブジェクト
+
+    Returns:
+        int: バイト数の合計
+
+    Examples:
+        >>> row = [0] * 100
+        >>> pair = [row, row]
+        >>> deep_sizeof(pair) == sys.getsizeof(pair) + deep_sizeof(row)
+        True
+        >>> deep_sizeof([row], shared=[row]) == sys.getsizeof([row])
+        True
+    """
+    seen = {id(obj) for obj in shared}
+    stack = [root]
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, (type, ModuleType)):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, FunctionType):
+            stack.extend(obj.__closure__ or ())
+        else:
+            stack.extend(gc.get_referents(obj))
+    return total
+
+
+class Session:
+    """1つのゲームのセッション
+    入力方針があればそれでキーを決め，なければ`press`で受け取ったキーを1ティックに1つ使う．
+
+    Attributes:
+        id (int): セッションの番号
+        params (Parameters): configのパラメータのインスタンス
+        game (Game): 描画とキー入力なしのゲーム
+        policy (Policy | None): 入力方針，Noneなら`press`で受け取ったキーを使う
+        keys (list[deque[str]]): プレイヤーごとの届いたがまだ使っていないキー
+        ticks (int): 進めたティック数
+        result (GameResult | None): 終わったゲームの結果，実行中はNone
+        task (asyncio.Task | None): セッションを進めているタスク
+
+    Examples:
+        >>> params = Parameters(
+        ...     field_size=10, enemy_num=0, seed=1, max_ticks=2)
+        >>> session = Session(0, params)
+        >>> session.press("d")
+        >>> session.step(), session.step()
+        (True, False)
+        >>> session.result.ticks, session.result.cause
+        (2, 'max_ticks')
+    """
+
+    def __init__(
+            self,
+            id: int,
+            params: Parameters,
+            policy: Policy | None = None) -> None:
+        """
+        Sessionクラスの初期化をする関数
+
+        Args:
+            id (int): セッションの番号
+            params (Parameters): configのパラメータのインスタンス
+            policy (Policy | None): 入力方針，Noneなら`press`で受け取ったキーを使う
+        """
+        self.id = id
+        self.params = replace(params, headless=True)
+        self.game = Game(self.params, autostart=False)
+        self.policy = policy
+        self.keys = [deque(maxlen=4) for _ in self.game.players]
+        self.ticks = 0
+        self.result: GameResult | None = None
+        self.task: asyncio.Task | None = None
+        self._begin = time.perf_counter()
+
+    def press(self, key: str, player: int = 0) -> None:
+        """
+        プレイヤーのキー入力を受け取るメソッド
+
+        Args:
+            key (str): 押されたキー
+            player (int): プレイヤーの番号
+        """
+        self.keys[player].append(key)
+
+    def step(self) -> bool:
+        """
+        ゲームを1ティック進めるメソッド
+
+        Returns:
+            bool: ゲームが続いていればTrue，終わればFalse
+        """
+        game = self.game
+        if self.policy is not None:
+            keys = [self.policy(game) for _ in game.players]
+        else:
+            keys = [q.popleft() if q else "" for q in self.keys]
+        if None in keys:
+            return self._finish("input_end")
+        outcome = game.step(keys)
+        self.ticks += 1
+        if outcome == GAME_OVER:
+            return self._finish("enemy")
+        if outcome == NEXT_STAGE:
+            game.next_stage(self.params)
+        if 0 < self.params.max_ticks <= self.ticks:
+            return self._finish("max_ticks")
+        return True
+
+    def memory(self) -> int:
+        """
+        このセッションだけが持っているオブジェクトのバイト数を返すメソッド
+        パラメータとタスクは数えない．
+
+        Returns:
+            int: バイト数
+        """
+        return deep_sizeof(self, shared=(self.params, self.task))
+
+    def close(self) -> None:
+        """ゲームの記録を閉じるメソッド"""
+        self.game.close()
+
+    def _finish(self, cause: str) -> bool:
+        """結果を記録し，ゲームが終わったことを返す"""
+        self.result = GameResult(
+            stages_cleared=self.game.clear_count,
+            ticks=self.ticks,
+            cause=cause,
+            elapsed=time.perf_counter() - self._begin)
+        return False
+
+
+class SessionHost:
+    """多数のセッションを1つのイベントループで進めるクラス
+    セッションごとにタスクとティックスケジューラを持ち，`tick_interval`の間隔で進める．
+    一度に作ったセッションのティックが重ならないよう，最初のティックを間隔の中でずらす．
+    ゲームが終わったセッションは自動で破棄し，`on_finish`を呼ぶ．
+
+    Attributes:
+        params (Parameters): セッションに使うパラメータ
+        sessions (dict[int, Session]): セッションの番号 -> 実行中のセッション
+        on_finish (Callable[[Session], None] | None): ゲームが終わったセッションを受け取る関数
+        ticks (int): 全てのセッションで進めたティック数の合計
+        overruns (int): ティックの予定時刻に間に合わなかった回数の合計
+        finished (int): ゲームが終わったセッションの数
+        step_times (LatencyHistogram): 1ティックの処理時間
+
+    Examples:
+        >>> params = Parameters(
+        ...     field_size=10, enemy_num=0, seed=1, max_ticks=3,
+        ...     tick_interval=0.001)
+        >>> async def demo():
+        ...     host = SessionHost(params)
+        ...     sessions = [host.create(random_policy()) for _ in range(3)]
+        ...     host.destroy(sessions[0].id)
+        ...     await asyncio.gather(*(s.task for s in sessions[1:]))
+        ...     return len(host.sessions), host.finished, host.ticks
+        >>> asyncio.run(demo())
+        (0, 2, 6)
+    """
+
+    def __init__(
+            self,
+            params: Parameters,
+            on_finish: Callable[[Session], None] | None = None) -> None:
+        """
+        SessionHostクラスの初期化をする関数
+
+        Args:
+            params (Parameters): セッションに使うパラメータ
+            on_finish (Callable[[Session], None] | None): ゲームが終わったセッションを受け取る関数
+        """
+        self.params = replace(params, headless=True)
+        self.sessions: dict[int, Session] = {}
+        self.on_finish = on_finish
+        self.ticks = 0
+        self.overruns = 0
+        self.finished = 0
+        self.step_times = LatencyHistogram()
+        self._ids = itertools.count()
+
+    def create(
+            self,
+            policy: Policy | None = None,
+            params: Parameters | None = None) -> Session:
+        """
+        セッションを作って進め始めるメソッド．イベントループの中で呼ぶ
+
+        Args:
+            policy (Policy | None): 入力方針，Noneなら`Session.press`で受け取ったキーを使う
+            params (Parameters | None): このセッションだけのパラメータ，Noneならホストのもの．
+                ホストのパラメータにシードがあれば，セッションの番号を足したシードにする
+
+        Returns:
+            Session: 作ったセッション
+
+        Examples:
+            >>> async def seeds():
+            ...     host = SessionHost(Parameters(seed=5, enemy_num=0))
+            ...     sessions = [host.create(random_policy()) for _ in range(3)]
+            ...     await host.close()
+            ...     return [s.params.seed for s in sessions]
+            >>> asyncio.run(seeds())
+            [5, 6, 7]
+        """
+        session_id = next(self._ids)
+        if params is None:
+            params = self.params
+            if params.seed >= 0:
+                # 全てのセッションが同じステージと敵の動きにならないようにする
+                params = replace(params, seed=params.seed + session_id)
+        session = Session(session_id, params, policy)
+        self.sessions[session.id] = session
+        session.task = asyncio.get_running_loop().create_task(
+            self._run(session))
+        return session
+
+    def destroy(self, session_id: int) -> None:
+        """
+        セッションを止めて破棄するメソッド
+
+        Args:
+            session_id (int): セッションの番号
+        """
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.task.cancel()
+            session.close()
+
+    def memory(self) -> dict[int, int]:
+        """
+        セッションごとのメモリ使用量を返すメソッド
+
+        Returns:
+            dict[int, int]: セッションの番号 -> バイト数
+        """
+        return {id: session.memory() for id, session in self.sessions.items()}
+
+    async def close(self) -> None:
+        """全てのセッションを破棄し，タスクが終わるのを待つコルーチン"""
+        tasks = [session.task for session in self.sessions.values()]
+        for session_id in list(self.sessions):
+            self.destroy(session_id)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, session: Session) -> None:
+        """セッションを一定の間隔で進め，ゲームが終わったら破棄するコルーチン"""
+        interval = session.params.tick_interval
+        await asyncio.sleep(interval * (session.id * GOLDEN % 1))
+        scheduler = TickScheduler(
+            interval, clock=asyncio.get_running_loop().time)
+        while True:
+            begin = time.perf_counter_ns()
+            running = session.step()
+            self.step_times.record(time.perf_counter_ns() - begin)
+            self.ticks += 1
+            if not running:
+                break
+            overruns = scheduler.overruns
+            delay = scheduler.delay()
+            self.overruns += scheduler.overruns - overruns
+            await asyncio.sleep(delay)
+        if self.sessions.pop(session.id, None) is not None:
+            session.close()
+            self.finished += 1
+            if self.on_finish is not None:
+                self.on_finish(session)
+
+
+async def measure(params: Parameters, sessions: int, seconds: float) -> dict:
+    """
+    セッション数を一定に保って進め，ティックの予定時刻に間に合うかを計測するコルーチン
+    ゲームが終わったセッションはすぐに新しいセッションで置き換える．
+
+    Args:
+        params (Parameters): configのパラメータのインスタンス
+        sessions (int): 同時に進めるセッションの数
+        seconds (float): 計測する時間(秒)
+
+    Returns:
+        dict: ティック数，間に合わなかった割合，作成と破棄の時間，メモリ使用量など
+    """
+    rng = random.Random(0)
+    policy = random_policy(rng)
+    host = SessionHost(params, on_finish=lambda _: host.create(policy))
+    begin = time.perf_counter()
+    for _ in range(sessions):
+        host.create(policy)
+    create_us = (time.perf_counter() - begin) / sessions * 1e6
+    # 全てのセッションを数えると計測の大半を占めるため，一部だけを数える
+    sample = [
+        session.memory() for session in rng.sample(
+            list(host.sessions.values()), min(100, sessions))]
+    # 全てのセッションが最初のティックを迎えてから計測する
+    await asyncio.sleep(params.tick_interval)
+    ticks, overruns, finished = host.ticks, host.overruns, host.finished
+    begin = time.perf_counter()
+    await asyncio.sleep(seconds)
+    elapsed = time.perf_counter() - begin
+    ticks, overruns = host.ticks - ticks, host.overruns - overruns
+    finished = host.finished - finished
+    begin = time.perf_counter()
+    await host.close()
+    destroy_us = (time.perf_counter() - begin) / sessions * 1e6
+    return {
+        "sessions": sessions,
+        "ticks": ticks,
+        "ticks_per_sec": ticks / elapsed,
+        "expected_ticks_per_sec": sessions / params.tick_interval,
+        "overrun_ratio": overruns / ticks if ticks else 1.0,
+        "games_finished": finished,
+        "step": host.step_times.summary(),
+        "create_us": create_us,
+        "destroy_us": destroy_us,
+        "session_bytes": sum(sample) / len(sample),
+    }
+
+
+async def load_test(
+        params: Parameters,
+        start: int = 250,
+        limit: int = 64000,
+        seconds: float = 10.0,
+        max_overrun: float = 0.01) -> dict:
+    """
+    セッション数を倍にしながら計測し，1プロセスで保てるセッション数を求めるコルーチン
+    予定時刻に間に合わなかったティックの割合が`max_overrun`以下なら保てたとする．
+
+    Args:
+        params (Parameters): configのパラメータのインスタンス
+        start (int): 最初のセッション数
+        limit (int): セッション数の上限
+        seconds (float): 1段階の計測時間(秒)
+        max_overrun (float): 保てたとみなす，間に合わなかったティックの割合の上限
+
+    Returns:
+        dict: 保てたセッション数と，段階ごとの計測結果
+    """
+    steps = []
+    sustained = 0
+    sessions = start
+    while sessions <= limit:
+        step = await measure(params, sessions, seconds)
+        steps.append(step)
+        logger.info(
+            f'{sessions} sessions: '
+            f'overrun {step["overrun_ratio"]:.2%}, '
+            f'{step["ticks_per_sec"]:.0f} ticks/sec')
+        if step["overrun_ratio"] > max_overrun:
+            break
+        sustained = sessions
+        sessions *= 2
+    return {
+        "tick_interval": params.tick_interval,
+        "max_overrun": max_overrun,
+        "sustained_sessions": sustained,
+        "steps": steps,
+    }
+
+
+def main() -> None:
+
+    # コマンドライン引数の設定
+    parser = argparse.ArgumentParser()
+    parser = common_args(parser)  # コマンドライン引数引数を読み込み
+    parser.add_argument(
+        "--start", help="最初のセッション数", type=int, default=250)
+    parser.add_argument(
+        "--limit", help="セッション数の上限", type=int, default=64000)
+    parser.add_argument(
+        "--seconds", help="1段階の計測時間(秒)", type=float, default=10.0)
+    parser.add_argument(
+        "--max_overrun",
+        help="保てたとみなす，予定時刻に間に合わなかったティックの割合の上限",
+        type=float,
+        default=0.01)
+    args = parser.parse_args()
+    params = Parameters(**setup_params(vars(args), args.parameters))
+
+    # 結果出力用ファイルの作成
+    result_dir = f'result/{params.run_date}'  # 結果出力ディレクトリ
+    os.mkdir(result_dir)  # 実行日時を名前とするディレクトリを作成
+    dump_params(params, f'{result_dir}')  # パラメータを出力
+
+    # ログ設定
+    set_logging(result_dir)  # ログを標準出力とファイルに出力するよう設定
+    logging.getLogger("game").setLevel(logging.WARNING)  # 1ゲームごとのログは出さない
+    logger.info(params)
+
+    report = asyncio.run(load_test(
+        params, args.start, args.limit, args.seconds, args.max_overrun))
+    with open(f'{result_dir}/load_test.json', 'w') as f:
+        json.dump(report, f, indent=4)
+    logger.info(report)
+
+
+if __name__ == "__main__":
+    main()
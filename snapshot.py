@@ -0,0 +1,332 @@
+"""スナップショット
+実行中のゲームの状態(アイテムの座標と状態，ステージクリア数，ティック数，乱数の状態)を
+固定のレイアウトのバイナリファイルに保存し，そこからゲームを再開するモジュール．
+ファイルは`mmap`で読み込み，座標の配列はそのままint32の配列として読むため，
+アイテムを1つずつ解析する必要がない．
+
+ファイルの形式(リトルエンディアン):
+    ヘッダ: マジック b"PMSS"，バージョン(uint8)，敵を動かす方法(uint8)，
+        敵の動き方(uint8)，シード(uint64)，ティック数(uint64)，ステージクリア数(uint32)，
+        field_size，enemy_num，food_num，player_num(uint32)，
+        アイテムの種類(`LAYERS`)ごとの数(uint32 x 5)
+    乱数の状態: `random.Random`のメルセンヌ・ツイスタの状態(uint32 x 625)，
+        gaussの値があるか(uint8)，gaussの値(float64)，
+        NumPyのPCG64の状態と増分(128bit整数 x 2)，has_uint32(uint8)，uinteger(uint32)
+    本体: アイテムの種類ごとにx座標(int32 x 数)，y座標(int32 x 数)，
+        状態(uint8 x 数，4バイト境界まで0で埋める)．
+        最後にプレイヤーの顔(uint8 x プレイヤー数，`FACES`の添字，4バイト境界まで埋める)
+
+Usage:
+    python main.py --restore result/20240101_000000/snapshot.bin
+"""
+from __future__ import annotations
+import os
+import sys
+import mmap
+import struct
+from array import array
+from dataclasses import replace
+from typing import TYPE_CHECKING
+from config import Parameters
+from player import Player
+from wall import Wall
+from block import Block
+from enemy import Enemy
+from food import Food
+if TYPE_CHECKING:
+    from game import Game
+
+
+MAGIC = b"PMSS"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBxQQIIIII5I")
+RANDOM = struct.Struct("<625IBxxxd16s16sBxxxI")
+# アイテムの種類と，復元するときのクラス(Fieldに渡す順)
+LAYERS = (
+    ("players", Player),
+    ("walls", Wall),
+    ("blocks", Block),
+    ("enemies", Enemy),
+    ("foods", Food),
+)
+FACES = ("😶", "😊", "😭")  # プレイヤーの顔
+ENGINES = ("python", "numpy")
+POLICIES = ("random", "chase")
+
+
+def _padded(n: int) -> int:
+    """nバイトを4バイト境界に切り上げる"""
+    return -(-n // 4) * 4
+
+
+def _int32s(values) -> bytes:
+    """整数の列をリトルエンディアンのint32のバイト列にする"""
+    data = array("i", values)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data.tobytes()
+
+
+def _bytes(values) -> bytes:
+    """0から255の整数の列を4バイト境界まで埋めたバイト列にする"""
+    data = bytes(values)
+    return data + bytes(_padded(len(data)) - len(data))
+
+
+def save(game: Game, path: str) -> None:
+    """
+    ゲームの状態をスナップショットとして書き出す関数
+    一時ファイルに書いてから置き換えるため，書き出しの途中で止まっても前のファイルは壊れない．
+
+    Args:
+        game (Game): 保存するゲーム
+        path (str): 書き出し先のパス
+
+    Examples:
+        >>> import os
+        >>> import tempfile
+        >>> from game import Game
+        >>> params = Parameters(field_size=10, seed=3, headless=True)
+        >>> game = Game(params, autostart=False)
+        >>> _ = game.step(["d"])
+        >>> path = os.path.join(tempfile.mkdtemp(), "snapshot.bin")
+        >>> save(game, path)
+        >>> with load(path) as snapshot:
+        ...     restored = Game(
+        ...         snapshot.parameters(params), autostart=False,
+        ...         snapshot=snapshot)
+        >>> restored.tick, restored.rng.random() == game.rng.random()
+        (1, True)
+        >>> ([p.get_pos() for p in restored.players]
+        ...  == [p.get_pos() for p in game.players])
+        True
+        >>> restored.step(["s"]) == game.step(["s"])
+        True
+        >>> ([e.get_pos() for e in restored.enemies]
+        ...  == [e.get_pos() for e in game.enemies])
+        True
+    """
+    params = game.params
+    layers = {name: getattr(game, name) for name, _ in LAYERS}
+    version, state, gauss = game.rng.getstate()
+    numpy_state = (0, 0, 0, 0)
+    engine = game.enemy_engine
+    if engine is not None:
+        bit_generator = engine.rng.bit_generator.state
+        numpy_state = (
+            bit_generator["state"]["state"],
+            bit_generator["state"]["inc"],
+            bit_generator["has_uint32"],
+            bit_generator["uinteger"])
+    parts = [
+        HEADER.pack(
+            MAGIC,
+            VERSION,
+            ENGINES.index(params.enemy_engine),
+            POLICIES.index(params.enemy_policy),
+            game.seed,
+            game.tick,
+            game.clear_count,
+            params.field_size,
+            params.enemy_num,
+            params.food_num,
+            params.player_num,
+            *(len(items) for items in layers.values())),
+        RANDOM.pack(
+            *state,
+            gauss is not None,
+            gauss or 0.0,
+            numpy_state[0].to_bytes(16, "little"),
+            numpy_state[1].to_bytes(16, "little"),
+            numpy_state[2],
+            numpy_state[3]),
+    ]
+    for name, items in layers.items():
+        if name == "enemies" and engine is not None:
+            # NumPyのエンジンの座標は敵のインスタンスに書き戻されていないことがある
+            parts.append(engine.xs.astype("<i4").tobytes())
+            parts.append(engine.ys.astype("<i4").tobytes())
+        else:
+            parts.append(_int32s(item.now_x for item in items))
+            parts.append(_int32s(item.now_y for item in items))
+        parts.append(_bytes(item.status for item in items))
+    parts.append(_bytes(
+        FACES.index(p.icon) if p.icon in FACES else 0
+        for p in game.players))
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(b"".join(parts))
+    os.replace(tmp, path)
+
+
+def load(path: str) -> Snapshot:
+    """
+    スナップショットを`mmap`で読み込む関数．使い終わったら`close`するか`with`で使う
+
+    Args:
+        path (str): スナップショットのパス
+
+    Returns:
+        Snapshot: 読み込んだスナップショット
+    """
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return Snapshot(buffer)
+
+
+class Snapshot:
+    """読み込んだスナップショット
+    ヘッダだけを解析し，アイテムの座標は読み込んだバッファの上の配列として参照する．
+
+    Attributes:
+        seed (int): 乱数のシード
+        tick (int): ゲーム開始からのティック数
+        clear_count (int): ステージクリア数
+        field_size (int): フィールドサイズ
+        enemy_num (int): 敵の数(パラメータ)
+        food_num (int): 食べ物の数
+        player_num (int): プレイヤーの数
+        enemy_engine (str): 敵を動かす方法
+        enemy_policy (str): 敵の動き方
+        counts (dict[str, int]): アイテムの種類 -> 数
+    """
+
+    def __init__(self, buffer: bytes | mmap.mmap) -> None:
+        """
+        Snapshotクラスの初期化をする関数
+
+        Args:
+            buffer (bytes | mmap.mmap): スナップショットのバイト列
+        """
+        (magic, version, engine, policy, self.seed, self.tick,
+         self.clear_count, self.field_size, self.enemy_num, self.food_num,
+         self.player_num, *counts) = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a snapshot of this version")
+        self.enemy_engine = ENGINES[engine]
+        self.enemy_policy = POLICIES[policy]
+        self.counts = {name: n for (name, _), n in zip(LAYERS, counts)}
+        self._buffer = buffer
+        self._view = memoryview(buffer)
+        self._arrays: list[memoryview] = []
+
+    def parameters(self, base: Parameters | None = None) -> Parameters:
+        """
+        スナップショットのステージを再開するためのパラメータを返すメソッド
+
+        Args:
+            base (Parameters | None): ステージに関係しない設定(描画や間隔など)の元，
+                Noneならデフォルト
+
+        Returns:
+            Parameters: ステージの設定をスナップショットに合わせたパラメータ
+        """
+        return replace(
+            base or Parameters(),
+            field_size=self.field_size,
+            enemy_num=self.enemy_num,
+            food_num=self.food_num,
+            player_num=self.player_num,
+            enemy_engine=self.enemy_engine,
+            enemy_policy=self.enemy_policy,
+            seed=self.seed)
+
+    def layer(self, name: str) -> tuple:
+        """
+        アイテムの種類ごとのx座標，y座標，状態の配列を返すメソッド
+
+        Args:
+            name (str): アイテムの種類(`LAYERS`の名前)
+
+        Returns:
+            tuple: x座標，y座標，状態の配列
+        """
+        offset = HEADER.size + RANDOM.size
+        for layer, _ in LAYERS:
+            n = self.counts[layer]
+            if layer == name:
+                xs = self._int32s(offset, n)
+                ys = self._int32s(offset + 4 * n, n)
+                status = self._view[offset + 8 * n:offset + 9 * n]
+                self._arrays.append(status)
+                return xs, ys, status
+            offset += 8 * n + _padded(n)
+        raise KeyError(name)
+
+    def faces(self) -> memoryview:
+        """プレイヤーの顔(`FACES`の添字)の配列を返すメソッド"""
+        offset = HEADER.size + RANDOM.size + sum(
+            8 * n + _padded(n) for n in self.counts.values())
+        faces = self._view[offset:offset + self.counts["players"]]
+        self._arrays.append(faces)
+        return faces
+
+    def apply(self, game: Game, params: Parameters) -> None:
+        """
+        スナップショットの状態をゲームに書き込み，ステージを作り直すメソッド
+
+        Args:
+            game (Game): 書き込むゲーム
+            params (Parameters): configのパラメータのインスタンス
+        """
+        game.seed = self.seed
+        game.tick = self.tick
+        game.clear_count = self.clear_count
+        for name, cls in LAYERS:
+            xs, ys, status = self.layer(name)
+            items = [cls(x, y) for x, y in zip(xs, ys)]
+            for i in [i for i, alive in enumerate(status) if not alive]:
+                items[i].status = False
+            setattr(game, name, items)
+        for player, face in zip(game.players, self.faces()):
+            player.icon = FACES[face]
+        game.build_stage(params)
+        # ステージを作ると乱数を引くため，乱数の状態は最後に戻す
+        values = RANDOM.unpack_from(self._buffer, HEADER.size)
+        state, (has_gauss, gauss, pcg_state, inc, has_uint32, uinteger) = \
+            values[:625], values[625:]
+        game.rng.setstate((3, state, gauss if has_gauss else None))
+        if game.enemy_engine is not None:
+            game.enemy_engine.rng.bit_generator.state = {
+                "bit_generator": "PCG64",
+                "state": {
+                    "state": int.from_bytes(pcg_state, "little"),
+                    "inc": int.from_bytes(inc, "little")},
+                "has_uint32": has_uint32,
+                "uinteger": uinteger,
+            }
+
+    def close(self) -> None:
+        """配列の参照を解放し，読み込んだバッファを閉じるメソッド"""
+        for view in reversed(self._arrays):
+            view.release()
+        self._arrays.clear()
+        self._view.release()
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+    def __enter__(self) -> Snapshot:
+        """`with`で使う"""
+        return self
+
+    def __exit__(self, *exc) -> None:
+        """`with`を抜けるときに閉じる"""
+        self.close()
+
+    def _int32s(self, offset: int, n: int) -> memoryview | array:
+        """バッファの上のint32の配列を返す．ビッグエンディアンの環境では並べ替えて複製する"""
+        view = self._view[offset:offset + 4 * n]
+        self._arrays.append(view)
+        if sys.byteorder == "big":
+            data = array("i")
+            data.frombytes(view)
+            data.byteswap()
+            return data
+        view = view.cast("i")
+        self._arrays.append(view)
+        return view
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
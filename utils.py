@@ -1,26 +1,122 @@
 """便利な関数群"""
 from __future__ import annotations
-import subprocess
+import atexit
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 import json
 from datetime import datetime
 import os
 from dataclasses import asdict
+from functools import lru_cache
 from typing import Any
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from config import Parameters
 
 
+# set_logging で付けたQueueHandlerと，それを書き出すQueueListener
+_listeners: list[tuple[QueueHandler, QueueListener]] = []
+
+
+@lru_cache(maxsize=None)
 def get_git_revision() -> str:
     """
     現在のGitのリビジョンを取得
+    サブプロセスを起動せずに`.git`のHEADと参照を直接読む．読めない場合だけ`git rev-parse`を使う．
+    同じプロセスでは結果を使い回す．
     Returns:
          str: revision ID
     """
-    cmd = "git rev-parse HEAD"
-    revision = subprocess.check_output(cmd.split())  # 現在のコードのgitのリビジョンを取得
-    return revision.decode()
+    revision = read_git_revision(os.path.dirname(os.path.abspath(__file__)))
+    if revision is None:
+        import subprocess  # 遅いため，必要なときだけ読み込む
+        cmd = "git rev-parse HEAD"
+        revision = subprocess.check_output(cmd.split()).decode().strip()
+    return revision
+
+
+def read_git_revision(path: str) -> str | None:
+    """
+    pathを含むGitリポジトリのHEADのリビジョンを，`.git`のファイルから読む関数
+    HEADがブランチを指していれば，そのブランチの参照ファイルかpacked-refsを読む．
+
+    Args:
+        path (str): リポジトリの中のディレクトリ
+
+    Returns:
+        str | None: revision ID，読めなければNone
+
+    Examples:
+        >>> import tempfile
+        >>> root = tempfile.mkdtemp()
+        >>> os.makedirs(f'{root}/.git/refs/heads')
+        >>> with open(f'{root}/.git/HEAD', 'w') as f:
+        ...     _ = f.write('ref: refs/heads/main\\n')
+        >>> read_git_revision(root) is None
+        True
+        >>> with open(f'{root}/.git/packed-refs', 'w') as f:
+        ...     _ = f.write('a' * 40 + ' refs/heads/main\\n')
+        >>> read_git_revision(root) == 'a' * 40
+        True
+        >>> with open(f'{root}/.git/refs/heads/main', 'w') as f:
+        ...     _ = f.write('b' * 40 + '\\n')
+        >>> read_git_revision(root) == 'b' * 40
+        True
+    """
+    git_dir = _find_git_dir(path)
+    if git_dir is None:
+        return None
+    try:
+        with open(os.path.join(git_dir, 'HEAD')) as f:
+            head = f.read().strip()
+    except OSError:
+        return None
+    if not head.startswith('ref:'):
+        return head or None  # HEADが直接リビジョンを指している場合
+    ref = head[len('ref:'):].strip()
+    # ワークツリーでは，ブランチの参照は共有のディレクトリにある
+    common_dir = git_dir
+    try:
+        with open(os.path.join(git_dir, 'commondir')) as f:
+            common_dir = os.path.join(git_dir, f.read().strip())
+    except OSError:
+        pass
+    for base in dict.fromkeys((git_dir, common_dir)):
+        try:
+            with open(os.path.join(base, ref)) as f:
+                return f.read().strip()
+        except OSError:
+            pass
+    try:
+        with open(os.path.join(common_dir, 'packed-refs')) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2 and parts[1] == ref:
+                    return parts[0]
+    except OSError:
+        pass
+    return None
+
+
+def _find_git_dir(path: str) -> str | None:
+    """pathから親をたどって`.git`を探し，Gitのディレクトリを返す．なければNone"""
+    path = os.path.abspath(path)
+    while True:
+        dot_git = os.path.join(path, '.git')
+        if os.path.isdir(dot_git):
+            return dot_git
+        if os.path.isfile(dot_git):
+            # ワークツリーやサブモジュールでは`.git`はGitのディレクトリを指すファイル
+            with open(dot_git) as f:
+                content = f.read().strip()
+            if content.startswith('gitdir:'):
+                return os.path.join(path, content[len('gitdir:'):].strip())
+            return None
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
 
 
 def setup_params(
@@ -78,15 +174,24 @@ def dump_params(
 def set_logging(result_dir: str) -> 'logging.Logger':
     """
     ログを標準出力とファイルに書き出すよう設定する関数．
+    rootのloggerにはキューに入れるだけのQueueHandlerを付け，
+    標準出力とファイルへの書き出しは別スレッドのQueueListenerが行う．
+    そのため，ゲームループの中でログを出してもディスクへの書き込みを待たない．
+    QueueListenerはプロセスの終了時か`stop_logging`で止まり，残ったログを書き出す．
     Args:
         result_dir (str): ログの出力先
     Returns:
         設定済みのrootのlogger
 
     Example:
+    >>> import tempfile
+    >>> result_dir = tempfile.mkdtemp()
     >>> logger = logging.getLogger(__name__)
-    >>> set_logging(result_dir)
-    >>> logger.info('log message...')
+    >>> _ = set_logging(result_dir)
+    >>> logger.debug('log message...')
+    >>> stop_logging()
+    >>> 'log message...' in open(f'{result_dir}/log.log').read()
+    True
     """
     logger = logging.getLogger()
     logger.setLevel(logging.DEBUG)  # ログレベル
@@ -96,16 +201,37 @@ def set_logging(result_dir: str) -> 'logging.Logger':
     handler = logging.StreamHandler()
     handler.setLevel(logging.INFO)  # 出力ログレベル
     handler.setFormatter(formatter)  # フォーマットを指定
-    logger.addHandler(handler)
     # ファイル出力へのログ出力設定
     file_handler = logging.FileHandler(f'{result_dir}/log.log', 'w')
     # ログ出力ファイル
     file_handler.setLevel(logging.DEBUG)  # 出力ログレベル
     file_handler.setFormatter(formatter)  # フォーマットを指定
-    logger.addHandler(file_handler)
+    # キューを介して，別スレッドで標準出力とファイルに書き出す
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(
+        log_queue, handler, file_handler, respect_handler_level=True)
+    listener.start()
+    queue_handler = QueueHandler(log_queue)
+    logger.addHandler(queue_handler)
+    if not _listeners:
+        atexit.register(stop_logging)
+    _listeners.append((queue_handler, listener))
     return logger
 
 
+def stop_logging() -> None:
+    """
+    `set_logging`で始めたQueueListenerを止める関数．キューに残ったログを書き出してから戻る
+    """
+    root = logging.getLogger()
+    while _listeners:
+        queue_handler, listener = _listeners.pop()
+        root.removeHandler(queue_handler)
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
 def update_json(json_file: str, input_dict: dict[str, Any]) -> None:
     """jsonファイルをupdateするプログラム
         import json が必要
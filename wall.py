@@ -1,6 +1,9 @@
 from item import Item
 
 
+ICON = "⚪"  # 壁のアイコン
+
+
 class Wall(Item):
     """
     Wallクラス
@@ -23,9 +26,11 @@ class Wall(Item):
         True
     """
 
+    __slots__ = ()
+
     def __init__(self, x, y) -> None:
         super().__init__(x, y)
-        self.icon = "⚪"
+        self.icon = ICON
 
 
 if __name__ == "__main__":